@@ -1,17 +1,20 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from models import db, User, Student, Faculty, Admin, AttendanceSession, Attendance
-from face_utils import face_system
-from config import Config
+from flask_sock import Sock
+from models import (db, User, Student, Faculty, Admin, AttendanceSession, Attendance, AttendanceRollup,
+                    create_missing_indexes)
+from face_utils import face_system, decode_image
+from attendance_utils import (mark_absentees, mark_session_students, session_rosters, student_summary,
+                              record_session_started, record_student_registered, rebuild_summaries,
+                              rebuild_rollups, check_summaries)
+from auth_utils import identity_cache
+from directory_utils import STUDENT_SEARCH_COLUMNS, student_directory, faculty_directory
+from report_utils import (FacultyReportTotals, faculty_analytics_summary, faculty_report_summary,
+                          faculty_session_stats, iter_faculty_session_stats, stream_csv, student_attendance_rows, student_breakdown,
+                          rollup_changes)
+from config import Config, configure_database
 from datetime import datetime, date, timezone
 import json
-import cv2
-import numpy as np
-import base64
-from PIL import Image
-import io
-import csv
-import io
 from datetime import datetime, timedelta
 from utils import format_local_time, format_local_time_short, format_local_date, get_local_time
 
@@ -29,18 +32,31 @@ def utility_processor():
     }
 
 db.init_app(app)
+with app.app_context():
+    configure_database(db.engine, app.config)
+sock = Sock(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'info'
 
+identity_cache.ttl = app.config['IDENTITY_CACHE_TTL']
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # One joined query, or none while the identity cache holds the user
+    return identity_cache.load(int(user_id))
 
 def create_admin_user():
     with app.app_context():
         db.create_all()
+        for index_name in create_missing_indexes():
+            print(f"✅ Created index {index_name}")
+        
+        # Databases from before the analytics rollups get them backfilled once
+        if AttendanceRollup.query.first() is None and Attendance.query.first() is not None:
+            rebuild_rollups()
+            print("✅ Attendance rollups backfilled")
         
         # First, load the face recognition model
         try:
@@ -82,6 +98,37 @@ def create_admin_user():
         except Exception as e:
             print(f"❌ Error creating admin user: {e}")
 
+@app.cli.command('migrate-face-data')
+def migrate_face_data():
+    """Pack legacy face_data JPEGs into the face sample store and delete them"""
+    migrated = face_system.sample_store.migrate_jpegs(app.config['FACE_DATA_FOLDER'], remove=True)
+    print(f"✅ Packed {migrated} face images into the sample store")
+
+@app.cli.command('create-indexes')
+def create_indexes_command():
+    """Add indexes declared in models.py that the database does not have yet"""
+    created = create_missing_indexes()
+    for index_name in created:
+        print(f"✅ Created index {index_name}")
+    if not created:
+        print("✅ All indexes already exist")
+
+@app.cli.command('rebuild-summaries')
+def rebuild_summaries_command():
+    """Recompute the attendance summary counters from the raw tables"""
+    rebuild_summaries()
+    print("✅ Attendance summaries rebuilt")
+
+@app.cli.command('check-summaries')
+def check_summaries_command():
+    """Compare the attendance summary counters with the raw tables"""
+    mismatches = check_summaries()
+    for mismatch in mismatches:
+        print(f"❌ {mismatch}")
+    if mismatches:
+        raise SystemExit(1)
+    print("✅ Attendance summaries match the raw tables")
+
 
 # ===== PUBLIC ROUTES =====
 @app.route('/')
@@ -149,6 +196,7 @@ def register(user_type):
                 year=request.form.get('year')
             )
             db.session.add(student)
+            record_student_registered(student)
         elif user_type == 'faculty':
             faculty = Faculty(
                 user_id=user.id,
@@ -172,21 +220,15 @@ def student_dashboard():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     if not student:
         flash('Student profile not found', 'error')
         return redirect(url_for('index'))
     
     # Get attendance statistics
-    total_sessions = AttendanceSession.query.filter_by(
-        branch=student.branch, 
-        year=student.year
-    ).count()
-    
-    present_count = Attendance.query.filter_by(
-        student_id=student.id,
-        status='Present'
-    ).count()
+    summary = student_summary(student.id)
+    total_sessions = summary.total_sessions
+    present_count = summary.present_count
     
     attendance_percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
     
@@ -211,13 +253,13 @@ def face_registration():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     
     if request.method == 'POST':
         if request.content_type == 'application/json':
             image_data = request.json.get('image')
-            success, message = face_system.register_face(image_data, student.id, student.name, app)
-            return jsonify({'success': success, 'message': message})
+            success, message, job_id = face_system.register_face(image_data, student.id, student.name, app)
+            return jsonify({'success': success, 'message': message, 'job_id': job_id})
     
     return render_template('student/face_registration.html', student=student)
 
@@ -228,51 +270,29 @@ def student_analytics():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     if not student:
         flash('Student profile not found', 'error')
         return redirect(url_for('index'))
     
     # Get attendance statistics
-    total_sessions = AttendanceSession.query.filter_by(
-        branch=student.branch, 
-        year=student.year
-    ).count()
-    
-    present_count = Attendance.query.filter_by(
-        student_id=student.id,
-        status='Present'
-    ).count()
+    summary = student_summary(student.id)
+    total_sessions = summary.total_sessions
+    present_count = summary.present_count
     
     attendance_percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
     
-    # Get all attendances for the student
+    # The page only lists the latest attendances
     attendances = db.session.query(Attendance, AttendanceSession).join(
         AttendanceSession, Attendance.session_id == AttendanceSession.id
     ).filter(
         Attendance.student_id == student.id
-    ).order_by(AttendanceSession.session_date.desc()).all()
-    
-    # Get simplified monthly data for demo
-    months_data = [
-        {'month': 'Jan 2024', 'present': 18, 'total': 20, 'percentage': 90},
-        {'month': 'Feb 2024', 'present': 16, 'total': 18, 'percentage': 89},
-        {'month': 'Mar 2024', 'present': 19, 'total': 20, 'percentage': 95},
-        {'month': 'Apr 2024', 'present': 17, 'total': 20, 'percentage': 85},
-        {'month': 'May 2024', 'present': 20, 'total': 20, 'percentage': 100},
-        {'month': 'Jun 2024', 'present': 15, 'total': 18, 'percentage': 83}
-    ]
+    ).order_by(AttendanceSession.session_date.desc()).limit(5).all()
     
-    # Day-wise statistics
-    day_stats = [
-        {'day': 'Monday', 'percentage': 92},
-        {'day': 'Tuesday', 'percentage': 88},
-        {'day': 'Wednesday', 'percentage': 95},
-        {'day': 'Thursday', 'percentage': 85},
-        {'day': 'Friday', 'percentage': 90},
-        {'day': 'Saturday', 'percentage': 78},
-        {'day': 'Sunday', 'percentage': 65}
-    ]
+    # Monthly and weekday breakdowns, recomputed only when the counters move
+    months_data, day_stats = student_breakdown(
+        student.id, (summary.total_sessions, summary.present_count, summary.absent_count)
+    )
     
     return render_template('student/analytics.html',
                          student=student,
@@ -290,69 +310,55 @@ def download_report():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     if not student:
         flash('Student profile not found', 'error')
         return redirect(url_for('index'))
     
-    # Create CSV report
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Student Attendance Report'])
-    writer.writerow(['Name:', student.name])
-    writer.writerow(['Roll Number:', student.roll_number])
-    writer.writerow(['Branch:', student.branch])
-    writer.writerow(['Year:', student.year])
-    writer.writerow(['Generated on:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
-    writer.writerow([])
-    writer.writerow(['Date', 'Class', 'Status', 'Session Time'])
-    
-    # Write attendance data
-    attendances = db.session.query(Attendance, AttendanceSession).join(
-        AttendanceSession, Attendance.session_id == AttendanceSession.id
-    ).filter(
-        Attendance.student_id == student.id
-    ).order_by(AttendanceSession.session_date.desc()).all()
-    
-    for attendance, session in attendances:
-        writer.writerow([
-            session.session_date.strftime('%Y-%m-%d'),
-            session.class_name,
-            attendance.status,
-            session.start_time.strftime('%H:%M') if session.start_time else 'N/A'
-        ])
-    
-    # Calculate summary
-    total_sessions = AttendanceSession.query.filter_by(
-        branch=student.branch, 
-        year=student.year
-    ).count()
-    
-    present_count = Attendance.query.filter_by(
-        student_id=student.id,
-        status='Present'
-    ).count()
-    
-    attendance_percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
+    # Capture what the generator needs before the response starts streaming
+    student_id = student.id
+    total_sessions = student_summary(student.id).total_sessions
+    header = [
+        ['Student Attendance Report'],
+        ['Name:', student.name],
+        ['Roll Number:', student.roll_number],
+        ['Branch:', student.branch],
+        ['Year:', student.year],
+        ['Generated on:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+        [],
+        ['Date', 'Class', 'Status', 'Session Time']
+    ]
     
-    writer.writerow([])
-    writer.writerow(['Summary'])
-    writer.writerow(['Total Sessions:', total_sessions])
-    writer.writerow(['Present:', present_count])
-    writer.writerow(['Absent:', total_sessions - present_count])
-    writer.writerow(['Attendance Percentage:', f"{attendance_percentage:.2f}%"])
-    
-    # Prepare response
-    output.seek(0)
-    response = app.response_class(
-        output,
+    def generate_rows():
+        yield from header
+        
+        # Attendance rows are paged from the database; present count in the same pass
+        present_count = 0
+        for session_date, class_name, status, start_time in student_attendance_rows(student_id):
+            if status == 'Present':
+                present_count += 1
+            yield [
+                session_date.strftime('%Y-%m-%d'),
+                class_name,
+                status,
+                start_time.strftime('%H:%M') if start_time else 'N/A'
+            ]
+        
+        attendance_percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
+        
+        yield []
+        yield ['Summary']
+        yield ['Total Sessions:', total_sessions]
+        yield ['Present:', present_count]
+        yield ['Absent:', total_sessions - present_count]
+        yield ['Attendance Percentage:', f"{attendance_percentage:.2f}%"]
+    
+    # Stream the report instead of building it in memory
+    return app.response_class(
+        stream_with_context(stream_csv(generate_rows())),
         mimetype='text/csv',
         headers={'Content-Disposition': f'attachment; filename=attendance_report_{student.roll_number}.csv'}
     )
-    
-    return response
 
 @app.route('/student/download-pdf-report')
 @login_required
@@ -361,7 +367,7 @@ def download_pdf_report():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = current_user.student
     if not student:
         flash('Student profile not found', 'error')
         return redirect(url_for('index'))
@@ -374,15 +380,9 @@ def download_pdf_report():
     ).order_by(AttendanceSession.session_date.desc()).all()
     
     # Calculate statistics
-    total_sessions = AttendanceSession.query.filter_by(
-        branch=student.branch, 
-        year=student.year
-    ).count()
-    
-    present_count = Attendance.query.filter_by(
-        student_id=student.id,
-        status='Present'
-    ).count()
+    summary = student_summary(student.id)
+    total_sessions = summary.total_sessions
+    present_count = summary.present_count
     
     attendance_percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
     
@@ -402,7 +402,7 @@ def faculty_dashboard():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    faculty = Faculty.query.filter_by(user_id=current_user.id).first()
+    faculty = current_user.faculty
     
     recent_sessions = AttendanceSession.query.filter_by(
         faculty_id=faculty.id
@@ -420,33 +420,10 @@ def faculty_analytics():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    faculty = Faculty.query.filter_by(user_id=current_user.id).first()
-    
-    # Get session statistics
-    total_sessions = AttendanceSession.query.filter_by(faculty_id=faculty.id).count()
-    completed_sessions = AttendanceSession.query.filter_by(faculty_id=faculty.id, is_completed=True).count()
-    active_sessions = AttendanceSession.query.filter_by(faculty_id=faculty.id, is_completed=False).count()
+    faculty = current_user.faculty
     
-    # Get attendance statistics
-    total_attendances = Attendance.query.join(AttendanceSession).filter(
-        AttendanceSession.faculty_id == faculty.id
-    ).count()
-    
-    present_count = Attendance.query.join(AttendanceSession).filter(
-        AttendanceSession.faculty_id == faculty.id,
-        Attendance.status == 'Present'
-    ).count()
-    
-    overall_percentage = (present_count / total_attendances * 100) if total_attendances > 0 else 0
-    
-    # Get recent sessions with attendance counts
-    recent_sessions = db.session.query(
-        AttendanceSession,
-        db.func.count(Attendance.id).filter(Attendance.status == 'Present').label('present_count'),
-        db.func.count(Attendance.id).label('total_attendance')
-    ).outerjoin(Attendance).filter(
-        AttendanceSession.faculty_id == faculty.id
-    ).group_by(AttendanceSession.id).order_by(AttendanceSession.start_time.desc()).limit(10).all()
+    # Session counts and attendance come from the session summaries
+    summary = faculty_analytics_summary(faculty.id)
     
     # Department statistics (simulated data for demo)
     dept_stats = [
@@ -459,11 +436,11 @@ def faculty_analytics():
     
     return render_template('faculty/analytics.html',
                          faculty=faculty,
-                         total_sessions=total_sessions,
-                         completed_sessions=completed_sessions,
-                         active_sessions=active_sessions,
-                         overall_percentage=round(overall_percentage, 2),
-                         recent_sessions=recent_sessions,
+                         total_sessions=summary['total_sessions'],
+                         completed_sessions=summary['completed_sessions'],
+                         active_sessions=summary['active_sessions'],
+                         overall_percentage=round(summary['overall_percentage'], 2),
+                         recent_sessions=summary['recent_sessions'],
                          dept_stats=dept_stats)
 
 @app.route('/faculty/download-report')
@@ -473,70 +450,51 @@ def faculty_download_report():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    faculty = Faculty.query.filter_by(user_id=current_user.id).first()
-    
-    # Create CSV report
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Faculty Attendance Report'])
-    writer.writerow(['Name:', faculty.name])
-    writer.writerow(['Employee ID:', faculty.employee_id])
-    writer.writerow(['Department:', faculty.department])
-    writer.writerow(['Generated on:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
-    writer.writerow([])
-    writer.writerow(['Session Date', 'Class', 'Branch', 'Year', 'Total Students', 'Present', 'Absent', 'Attendance %'])
-    
-    # Get all sessions for this faculty
-    sessions = AttendanceSession.query.filter_by(faculty_id=faculty.id).order_by(AttendanceSession.session_date.desc()).all()
-    
-    for session in sessions:
-        # Calculate attendance for this session
-        total_students = Student.query.filter_by(branch=session.branch, year=session.year).count()
-        present_count = Attendance.query.filter_by(session_id=session.id, status='Present').count()
-        absent_count = total_students - present_count
-        attendance_percentage = (present_count / total_students * 100) if total_students > 0 else 0
+    faculty = current_user.faculty
+    
+    header = [
+        ['Faculty Attendance Report'],
+        ['Name:', faculty.name],
+        ['Employee ID:', faculty.employee_id],
+        ['Department:', faculty.department],
+        ['Generated on:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+        [],
+        ['Session Date', 'Class', 'Branch', 'Year', 'Total Students', 'Present', 'Absent', 'Attendance %']
+    ]
+    faculty_id = faculty.id
+    
+    def generate_rows():
+        yield from header
+        
+        # Cohort sizes and present counts for every session in one streamed query,
+        # totalled in the same pass
+        totals = FacultyReportTotals()
+        for session in iter_faculty_session_stats(faculty_id):
+            totals.add(session)
+            yield [
+                session['date'].strftime('%Y-%m-%d'),
+                session['class_name'],
+                session['branch'],
+                session['year'],
+                session['total_students'],
+                session['present_count'],
+                session['absent_count'],
+                f"{session['attendance_percentage']:.2f}%"
+            ]
         
-        writer.writerow([
-            session.session_date.strftime('%Y-%m-%d'),
-            session.class_name,
-            session.branch,
-            session.year,
-            total_students,
-            present_count,
-            absent_count,
-            f"{attendance_percentage:.2f}%"
-        ])
-    
-    # Calculate summary
-    total_sessions = len(sessions)
-    total_present = Attendance.query.join(AttendanceSession).filter(
-        AttendanceSession.faculty_id == faculty.id,
-        Attendance.status == 'Present'
-    ).count()
-    
-    total_students_all = 0
-    for session in sessions:
-        total_students_all += Student.query.filter_by(branch=session.branch, year=session.year).count()
-    
-    overall_percentage = (total_present / total_students_all * 100) if total_students_all > 0 else 0
-    
-    writer.writerow([])
-    writer.writerow(['Summary'])
-    writer.writerow(['Total Sessions:', total_sessions])
-    writer.writerow(['Total Present Records:', total_present])
-    writer.writerow(['Overall Attendance Percentage:', f"{overall_percentage:.2f}%"])
-    
-    # Prepare response
-    output.seek(0)
-    response = app.response_class(
-        output,
+        summary = totals.summary()
+        yield []
+        yield ['Summary']
+        yield ['Total Sessions:', summary['total_sessions']]
+        yield ['Total Present Records:', summary['total_present']]
+        yield ['Overall Attendance Percentage:', f"{summary['overall_percentage']:.2f}%"]
+    
+    # Stream the report instead of building it in memory
+    return app.response_class(
+        stream_with_context(stream_csv(generate_rows())),
         mimetype='text/csv',
         headers={'Content-Disposition': f'attachment; filename=faculty_report_{faculty.employee_id}.csv'}
     )
-    
-    return response
 
 @app.route('/faculty/download-pdf-report')
 @login_required
@@ -545,52 +503,73 @@ def faculty_download_pdf_report():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    faculty = Faculty.query.filter_by(user_id=current_user.id).first()
-    
-    # Get all sessions for this faculty
-    sessions = AttendanceSession.query.filter_by(faculty_id=faculty.id).order_by(AttendanceSession.session_date.desc()).all()
+    faculty = current_user.faculty
     
-    # Calculate statistics
-    total_sessions = len(sessions)
-    completed_sessions = len([s for s in sessions if s.is_completed])
-    active_sessions = total_sessions - completed_sessions
-    
-    total_present = Attendance.query.join(AttendanceSession).filter(
-        AttendanceSession.faculty_id == faculty.id,
-        Attendance.status == 'Present'
-    ).count()
-    
-    total_students_all = 0
-    session_details = []
-    for session in sessions:
-        total_students = Student.query.filter_by(branch=session.branch, year=session.year).count()
-        total_students_all += total_students
-        present_count = Attendance.query.filter_by(session_id=session.id, status='Present').count()
-        attendance_percentage = (present_count / total_students * 100) if total_students > 0 else 0
-        
-        session_details.append({
-            'date': session.session_date,
-            'class_name': session.class_name,
-            'branch': session.branch,
-            'year': session.year,
-            'total_students': total_students,
-            'present_count': present_count,
-            'attendance_percentage': attendance_percentage,
-            'is_completed': session.is_completed
-        })
-    
-    overall_percentage = (total_present / total_students_all * 100) if total_students_all > 0 else 0
+    # Cohort sizes and present counts for every session in one query
+    sessions = faculty_session_stats(faculty.id)
+    summary = faculty_report_summary(sessions)
     
     return render_template('faculty/pdf_report.html',
                          faculty=faculty,
-                         sessions=session_details,
-                         total_sessions=total_sessions,
-                         completed_sessions=completed_sessions,
-                         active_sessions=active_sessions,
-                         total_present=total_present,
-                         overall_percentage=overall_percentage,
+                         sessions=sessions,
+                         total_sessions=summary['total_sessions'],
+                         completed_sessions=summary['completed_sessions'],
+                         active_sessions=summary['active_sessions'],
+                         total_present=summary['total_present'],
+                         overall_percentage=summary['overall_percentage'],
                          now=datetime.now())
 
+def open_faculty_session(session_id):
+    """The current faculty member's session if it is still taking attendance"""
+    session = AttendanceSession.query.get(session_id)
+    faculty = current_user.faculty
+    if not session or not faculty or session.faculty_id != faculty.id or session.is_completed:
+        return None
+    return session
+
+def process_attendance_frames(session_id, frames, cohort=None):
+    """Recognize faces in decoded (frame, camera_id) pairs and mark each student once"""
+    if cohort is None:
+        # Only the session's branch and year can be marked
+        session = AttendanceSession.query.get(session_id)
+        if session:
+            cohort = (session.branch, session.year)
+    
+    best_faces = {}
+    skipped_frames = 0
+    for frame, camera_id in frames:
+        # Recognize faces, reusing the last result for unchanged frames
+        recognized_faces, skipped = face_system.recognize_session_frame(frame, session_id, camera_id, cohort)
+        skipped_frames += skipped
+        
+        # The same student may show up in several frames or cameras
+        for face in recognized_faces:
+            if face['face_id'] and (face['face_id'] not in best_faces or
+                                    face['confidence'] > best_faces[face['face_id']]['confidence']):
+                best_faces[face['face_id']] = face
+    
+    # Only students not marked yet reach the database, in one insert
+    students = mark_session_students(session_id, best_faces)
+    results = []
+    for face_id, face in best_faces.items():
+        student = students.get(face_id)
+        if student:
+            results.append({
+                'success': True,
+                'student': dict(student, confidence=face['confidence'])
+            })
+    
+    return results, skipped_frames
+
+def process_attendance_frame(frame, session_id, camera_id=None, cohort=None):
+    """Recognize faces in a decoded frame and mark them present"""
+    results, skipped_frames = process_attendance_frames(session_id, [(frame, camera_id)], cohort)
+    return {
+        'faces': results,
+        'skipped': skipped_frames > 0,
+        'max_frame_width': app.config['FRAME_MAX_WIDTH']
+    }
+
 @app.route('/faculty/take-attendance', methods=['GET', 'POST'])
 @login_required
 def take_attendance():
@@ -598,7 +577,7 @@ def take_attendance():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    faculty = Faculty.query.filter_by(user_id=current_user.id).first()
+    faculty = current_user.faculty
     
     if request.method == 'POST':
         if request.content_type == 'application/json':
@@ -607,82 +586,37 @@ def take_attendance():
             if data.get('action') == 'process_frame':
                 # Process frame for face recognition
                 image_data = data.get('image')
-                session_id = data.get('session_id')
+                try:
+                    session = open_faculty_session(int(data.get('session_id')))
+                except (TypeError, ValueError):
+                    session = None
+                if not session:
+                    return jsonify({'faces': [], 'message': 'Invalid session'}), 403
                 
-                # Decode base64 image
-                image_bytes = base64.b64decode(image_data.split(',')[1])
-                image = Image.open(io.BytesIO(image_bytes))
-                frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+                frame = decode_image(image_data)
+                if frame is None:
+                    return jsonify({'faces': [], 'message': 'Could not decode frame'}), 400
                 
-                # Recognize faces
-                recognized_faces = face_system.recognize_face(frame)
-                
-                results = []
-                for face in recognized_faces:
-                    if face['face_id']:
-                        student = face_system.get_student_by_face_id(face['face_id'], app)
-                        if student:
-                            # Check if already marked
-                            existing = Attendance.query.filter_by(
-                                student_id=student.id,
-                                session_id=session_id
-                            ).first()
-                            
-                            if not existing:
-                                # Mark attendance
-                                attendance = Attendance(
-                                    student_id=student.id,
-                                    session_id=session_id,
-                                    status='Present'
-                                )
-                                db.session.add(attendance)
-                                db.session.commit()
-                            
-                            results.append({
-                                'success': True,
-                                'student': {
-                                    'id': student.id,
-                                    'name': student.name,
-                                    'roll_number': student.roll_number,
-                                    'branch': student.branch,
-                                    'year': student.year,
-                                    'confidence': face['confidence']
-                                }
-                            })
-                
-                return jsonify({'faces': results})
+                return jsonify(process_attendance_frame(frame, session.id, data.get('camera_id'),
+                                                        (session.branch, session.year)))
             
             else:
                 # Handle single face recognition (old format)
-                face_id = data.get('face_id')
-                session_id = data.get('session_id')
+                try:
+                    face_id = int(data.get('face_id'))
+                except (TypeError, ValueError):
+                    face_id = None
+                try:
+                    session = open_faculty_session(int(data.get('session_id')))
+                except (TypeError, ValueError):
+                    session = None
                 
-                if face_id and session_id:
-                    student = face_system.get_student_by_face_id(face_id, app)
+                if face_id and session:
+                    student = mark_session_students(session.id, [face_id]).get(face_id)
                     if student:
-                        existing = Attendance.query.filter_by(
-                            student_id=student.id,
-                            session_id=session_id
-                        ).first()
-                        
-                        if not existing:
-                            attendance = Attendance(
-                                student_id=student.id,
-                                session_id=session_id,
-                                status='Present'
-                            )
-                            db.session.add(attendance)
-                            db.session.commit()
-                        
                         return jsonify({
                             'success': True,
-                            'student': {
-                                'id': student.id,
-                                'name': student.name,
-                                'roll_number': student.roll_number,
-                                'branch': student.branch,
-                                'year': student.year
-                            }
+                            'student': student
                         })
                 
                 return jsonify({'success': False, 'message': 'Student not recognized'})
@@ -701,10 +635,17 @@ def take_attendance():
                 session_date=date.today()
             )
             db.session.add(session)
+            db.session.flush()
+            record_session_started(session)
             db.session.commit()
+            # Frames are answered from the roster instead of the database
+            session_rosters.load(session)
+            # The cohort's recognition shard is built in the background
+            face_system.open_cohort((branch, year))
             
             return render_template('faculty/take_attendance.html',
                                  faculty=faculty,
+                                 max_frame_width=app.config['FRAME_MAX_WIDTH'],
                                  session_id=session.id,
                                  class_name=class_name,
                                  branch=branch,
@@ -712,6 +653,132 @@ def take_attendance():
     
     return render_template('faculty/take_attendance.html', faculty=faculty)
 
+@app.route('/faculty/take-attendance/frame', methods=['POST'])
+@login_required
+def take_attendance_frame():
+    """Process one raw JPEG frame sent as the request body or a multipart file"""
+    if current_user.user_type != 'faculty':
+        return jsonify({'faces': [], 'message': 'Access denied'}), 403
+    
+    session_id = request.args.get('session_id', type=int) or request.form.get('session_id', type=int)
+    camera_id = request.args.get('camera_id') or request.form.get('camera_id')
+    if not session_id:
+        return jsonify({'faces': [], 'message': 'session_id is required'}), 400
+    session = open_faculty_session(session_id)
+    if not session:
+        return jsonify({'faces': [], 'message': 'Invalid session'}), 403
+    
+    if 'frame' in request.files:
+        image_bytes = request.files['frame'].read()
+    else:
+        image_bytes = request.get_data()
+    
+    frame = decode_image(image_bytes)
+    if frame is None:
+        return jsonify({'faces': [], 'message': 'Could not decode frame'}), 400
+    
+    return jsonify(process_attendance_frame(frame, session_id, camera_id, (session.branch, session.year)))
+
+@app.route('/faculty/take-attendance/batch', methods=['POST'])
+@login_required
+def take_attendance_batch():
+    """Process a burst of frames, possibly from several cameras, in one request
+    
+    Accepts multipart 'frames' files with an optional parallel list of
+    'camera_ids', or JSON {'session_id', 'frames': [{'image', 'camera_id'}]}.
+    """
+    if current_user.user_type != 'faculty':
+        return jsonify({'faces': [], 'message': 'Access denied'}), 403
+    
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('frames', []), list):
+            return jsonify({'faces': [], 'message': 'Expected {"session_id", "frames": [...]}'}), 400
+        try:
+            session_id = int(data.get('session_id'))
+        except (TypeError, ValueError):
+            return jsonify({'faces': [], 'message': 'session_id must be an integer'}), 400
+        # Items that are not objects count as rejected frames
+        uploads = [(item.get('image'), item.get('camera_id')) if isinstance(item, dict) else (None, None)
+                   for item in data.get('frames', [])]
+    else:
+        session_id = request.args.get('session_id', type=int) or request.form.get('session_id', type=int)
+        files = request.files.getlist('frames')
+        camera_ids = request.form.getlist('camera_ids')
+        camera_ids += [None] * (len(files) - len(camera_ids))
+        uploads = [(upload.read(), camera_id) for upload, camera_id in zip(files, camera_ids)]
+    
+    if not session_id:
+        return jsonify({'faces': [], 'message': 'session_id is required'}), 400
+    session = open_faculty_session(session_id)
+    if not session:
+        return jsonify({'faces': [], 'message': 'Invalid session'}), 403
+    
+    frames = []
+    for image_data, camera_id in uploads:
+        frame = decode_image(image_data)
+        if frame is not None:
+            frames.append((frame, camera_id))
+    
+    results, skipped_frames = process_attendance_frames(session_id, frames, (session.branch, session.year))
+    return jsonify({
+        'faces': results,
+        'frames': len(frames),
+        'frames_rejected': len(uploads) - len(frames),
+        'frames_skipped': skipped_frames,
+        'max_frame_width': app.config['FRAME_MAX_WIDTH']
+    })
+
+@sock.route('/faculty/attendance-stream/<int:session_id>')
+def attendance_stream(ws, session_id):
+    """Receive binary JPEG frames and push recognition events for one session
+    
+    Text messages are JSON control messages, e.g. {"camera_id": "front"}.
+    """
+    # Authentication and the session lookup happen once per connection
+    if not current_user.is_authenticated or current_user.user_type != 'faculty':
+        ws.close(reason=1008, message='Access denied')
+        return
+    
+    session = open_faculty_session(session_id)
+    if not session:
+        ws.close(reason=1008, message='Invalid session')
+        return
+    
+    cohort = (session.branch, session.year)
+    camera_id = None
+    # Hand the connection back to the pool between frames rather than
+    # holding it idle in a transaction for the life of the socket
+    db.session.remove()
+    ws.send(json.dumps({
+        'type': 'ready',
+        'session_id': session_id,
+        'max_frame_width': app.config['FRAME_MAX_WIDTH']
+    }))
+    
+    while True:
+        message = ws.receive()
+        if isinstance(message, str):
+            try:
+                control = json.loads(message)
+            except ValueError:
+                control = None
+            if not isinstance(control, dict):
+                ws.send(json.dumps({'type': 'error', 'message': 'Control messages must be JSON objects'}))
+                continue
+            camera_id = control.get('camera_id', camera_id)
+            continue
+        
+        frame = decode_image(message)
+        if frame is None:
+            ws.send(json.dumps({'type': 'error', 'message': 'Could not decode frame'}))
+            continue
+        
+        event = process_attendance_frame(frame, session_id, camera_id, cohort)
+        db.session.remove()
+        event['type'] = 'recognition'
+        ws.send(json.dumps(event))
+
 @app.route('/faculty/complete-attendance/<int:session_id>', methods=['POST'])
 @login_required
 def complete_attendance(session_id):
@@ -719,29 +786,19 @@ def complete_attendance(session_id):
         return jsonify({'success': False, 'message': 'Access denied'})
     
     session = AttendanceSession.query.get(session_id)
-    if not session or session.faculty.user_id != current_user.id:
+    faculty = current_user.faculty
+    if not session or not faculty or session.faculty_id != faculty.id:
         return jsonify({'success': False, 'message': 'Invalid session'})
     
     session.is_completed = True
     session.end_time = datetime.now(timezone.utc)  # Use timezone-aware datetime
     
-    students = Student.query.filter_by(
-        branch=session.branch,
-        year=session.year
-    ).all()
-    
-    present_student_ids = [att.student_id for att in session.attendances]
-    
-    for student in students:
-        if student.id not in present_student_ids:
-            attendance = Attendance(
-                student_id=student.id,
-                session_id=session_id,
-                status='Absent'
-            )
-            db.session.add(attendance)
+    # Everyone in the cohort without a row for the session is absent
+    mark_absentees(session)
     
     db.session.commit()
+    face_system.end_session(session_id)
+    session_rosters.evict(session_id)
     
     return jsonify({'success': True, 'message': 'Attendance completed successfully'})
 
@@ -768,6 +825,23 @@ def admin_dashboard():
                          total_sessions=total_sessions,
                          recent_sessions=recent_sessions)
 
+def directory_filters(args):
+    """Directory filters from the query string; unknown values are ignored"""
+    face_registered = {'yes': True, 'no': False}.get(args.get('face_registered'))
+    search_in = args.get('search_in')
+    return {
+        'students': {
+            'search': args.get('q', '').strip() or None,
+            'search_in': search_in if search_in in STUDENT_SEARCH_COLUMNS else 'name',
+            'branch': args.get('branch') or None,
+            'year': args.get('year') or None,
+            'face_registered': face_registered
+        },
+        'faculty': {
+            'search': args.get('faculty_q', '').strip() or None
+        }
+    }
+
 @app.route('/admin/users')
 @login_required
 def admin_users():
@@ -775,12 +849,37 @@ def admin_users():
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    students = Student.query.all()
-    faculty = Faculty.query.all()
+    filters = directory_filters(request.args)
+    page_size = app.config['ADMIN_USERS_PAGE_SIZE']
+    students = student_directory(page_size, **filters['students'])
+    faculty = faculty_directory(page_size, **filters['faculty'])
     
     return render_template('admin/users.html',
                          students=students,
-                         faculty=faculty)
+                         faculty=faculty,
+                         filters=request.args)
+
+@app.route('/admin/users/data')
+@login_required
+def admin_users_data():
+    """Next page of the student or faculty directory, for incremental loading"""
+    if current_user.user_type != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    directory = request.args.get('type', 'students')
+    if directory not in ('students', 'faculty'):
+        return jsonify({'error': 'type must be students or faculty'}), 400
+    
+    filters = directory_filters(request.args)[directory]
+    page_size = app.config['ADMIN_USERS_PAGE_SIZE']
+    try:
+        if directory == 'students':
+            page = student_directory(page_size, after=request.args.get('after'), **filters)
+        else:
+            page = faculty_directory(page_size, after=request.args.get('after'), **filters)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify(page)
 
 @app.route('/admin/analytics')
 @login_required
@@ -791,7 +890,30 @@ def admin_analytics():
     
     return render_template('admin/analytics.html')
 
+@app.route('/admin/analytics/data')
+@login_required
+def admin_analytics_data():
+    if current_user.user_type != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    # With ?since=<generated_at of the last response> only changed buckets are sent
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid since timestamp'}), 400
+    
+    return jsonify(rollup_changes(since or None))
+
 # ===== COMMON ROUTES =====
+@app.route('/face-model/status')
+@login_required
+def face_model_status():
+    status = face_system.training_status(request.args.get('job_id'))
+    status.update(face_system.frame_gate_stats())
+    return jsonify(status)
+
 @app.route('/logout')
 @login_required
 def logout():
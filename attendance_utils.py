@@ -0,0 +1,512 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from sqlalchemy import case, delete, func, insert, literal, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from models import (db, Student, AttendanceSession, Attendance, StudentAttendanceSummary,
+                    SessionAttendanceSummary, AttendanceRollup)
+
+STUDENT_FIELDS = (Student.id, Student.name, Student.roll_number, Student.branch, Student.year)
+
+
+def insert_ignore(model, conflict_columns):
+    """INSERT that skips rows violating a unique constraint, or None if unsupported"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(model).on_conflict_do_nothing(index_elements=conflict_columns)
+    if dialect == 'postgresql':
+        return postgresql.insert(model).on_conflict_do_nothing(index_elements=conflict_columns)
+    if dialect in ('mysql', 'mariadb'):
+        return mysql.insert(model).prefix_with('IGNORE')
+    return None
+
+
+def mark_students_present(marks, students=None):
+    """Mark (session_id, student_ids) pairs present in one transaction
+
+    Returns the marked students as plain dicts keyed by id; unknown ids are
+    skipped and students already marked for a session are left as they are.
+    Students passed in as dicts by id are not looked up again.
+    """
+    student_ids = set()
+    for _, ids in marks:
+        student_ids.update(ids)
+    if not student_ids:
+        return {}
+
+    students = {student_id: students[student_id] for student_id in student_ids & set(students or {})}
+    missing = student_ids - set(students)
+    if missing:
+        students.update(
+            (row.id, dict(row._mapping))
+            for row in db.session.execute(select(*STUDENT_FIELDS).where(Student.id.in_(missing)))
+        )
+
+    rows = {}
+    for session_id, ids in marks:
+        for student_id in ids:
+            if student_id in students:
+                rows[(student_id, session_id)] = {
+                    'student_id': student_id,
+                    'session_id': session_id,
+                    'status': 'Present'
+                }
+
+    try:
+        # The unique_student_session constraint makes re-marking a no-op;
+        # RETURNING tells which rows were new so the summaries stay exact
+        stmt = insert_ignore(Attendance, ['student_id', 'session_id'])
+        returning = stmt is not None and db.engine.dialect.insert_executemany_returning
+        if not returning and rows:
+            existing = db.session.execute(
+                select(Attendance.student_id, Attendance.session_id).where(
+                    Attendance.session_id.in_({session_id for _, session_id in rows}),
+                    Attendance.student_id.in_(students)
+                )
+            )
+            for key in existing:
+                rows.pop(tuple(key), None)
+            if stmt is None:
+                stmt = insert(Attendance)
+
+        if rows:
+            if returning:
+                stmt = stmt.returning(Attendance.student_id, Attendance.session_id)
+                inserted = [tuple(row) for row in db.session.execute(stmt, list(rows.values()))]
+            else:
+                db.session.execute(stmt, list(rows.values()))
+                inserted = list(rows)
+            record_attendance(inserted, 'Present')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return students
+
+
+def mark_absentees(session):
+    """Insert an Absent row for every cohort student without one for the session
+
+    A single INSERT ... SELECT, so calling it again inserts nothing.
+    Returns the number of students marked absent.
+    """
+    has_row = select(Attendance.id).where(
+        Attendance.session_id == session.id,
+        Attendance.student_id == Student.id
+    ).exists()
+    absentees = select(
+        Student.id,
+        literal(session.id),
+        literal('Absent'),
+        literal(datetime.now(timezone.utc), Attendance.marked_at.type)
+    ).where(Student.branch == session.branch, Student.year == session.year, ~has_row)
+
+    # Insert-or-ignore also covers two finalizations racing each other
+    stmt = insert_ignore(Attendance, ['student_id', 'session_id'])
+    if stmt is None:
+        stmt = insert(Attendance)
+    stmt = stmt.from_select(['student_id', 'session_id', 'status', 'marked_at'], absentees)
+    if db.engine.dialect.insert_returning:
+        inserted = [(student_id, session.id) for (student_id,) in db.session.execute(
+            stmt.returning(Attendance.student_id)
+        )]
+    else:
+        inserted = [(student_id, session.id) for (student_id,) in db.session.execute(
+            absentees.with_only_columns(Student.id)
+        )]
+        db.session.execute(stmt)
+    record_attendance(inserted, 'Absent')
+    return len(inserted)
+
+
+def student_counts_query():
+    """Summary counters of every student, computed from the raw tables"""
+    total_sessions = select(func.count(AttendanceSession.id)).where(
+        AttendanceSession.branch == Student.branch,
+        AttendanceSession.year == Student.year
+    ).scalar_subquery()
+    present_count = select(func.count(Attendance.id)).where(
+        Attendance.student_id == Student.id,
+        Attendance.status == 'Present'
+    ).scalar_subquery()
+    absent_count = select(func.count(Attendance.id)).where(
+        Attendance.student_id == Student.id,
+        Attendance.status == 'Absent'
+    ).scalar_subquery()
+    return select(
+        Student.id,
+        total_sessions.label('total_sessions'),
+        present_count.label('present_count'),
+        absent_count.label('absent_count')
+    )
+
+
+def session_counts_query():
+    """Summary counters of every session, computed from the raw tables"""
+    cohort_size = select(func.count(Student.id)).where(
+        Student.branch == AttendanceSession.branch,
+        Student.year == AttendanceSession.year
+    ).scalar_subquery()
+    present_count = select(func.count(Attendance.id)).where(
+        Attendance.session_id == AttendanceSession.id,
+        Attendance.status == 'Present'
+    ).scalar_subquery()
+    return select(
+        AttendanceSession.id,
+        cohort_size.label('cohort_size'),
+        present_count.label('present_count')
+    )
+
+
+def rollup_counts_query():
+    """Rollup buckets computed from the raw tables"""
+    present_count = func.sum(case((Attendance.status == 'Present', 1), else_=0))
+    absent_count = func.sum(case((Attendance.status == 'Absent', 1), else_=0))
+    return select(
+        AttendanceSession.session_date,
+        AttendanceSession.branch,
+        AttendanceSession.year,
+        AttendanceSession.faculty_id,
+        present_count.label('present_count'),
+        absent_count.label('absent_count'),
+        literal(datetime.now(timezone.utc), AttendanceRollup.updated_at.type)
+    ).join(Attendance, Attendance.session_id == AttendanceSession.id).group_by(
+        AttendanceSession.session_date,
+        AttendanceSession.branch,
+        AttendanceSession.year,
+        AttendanceSession.faculty_id
+    )
+
+
+def increment(model, key_column, column, counts):
+    """Add per-key amounts to a summary counter, one UPDATE per distinct amount"""
+    keys_by_amount = defaultdict(list)
+    for key, amount in counts.items():
+        keys_by_amount[amount].append(key)
+    for amount, keys in keys_by_amount.items():
+        db.session.execute(
+            update(model).where(key_column.in_(keys)).values({column.key: column + amount}).execution_options(
+                synchronize_session=False
+            )
+        )
+
+
+def record_attendance(inserted, status):
+    """Count newly inserted (student_id, session_id) rows into the summaries
+
+    Runs in the caller's transaction. Students and sessions without a
+    summary row yet are skipped; their row is built from the raw tables
+    when first read.
+    """
+    if not inserted:
+        return
+    student_column = (StudentAttendanceSummary.present_count if status == 'Present'
+                      else StudentAttendanceSummary.absent_count)
+    increment(StudentAttendanceSummary, StudentAttendanceSummary.student_id, student_column,
+              Counter(student_id for student_id, _ in inserted))
+    if status == 'Present':
+        increment(SessionAttendanceSummary, SessionAttendanceSummary.session_id,
+                  SessionAttendanceSummary.present_count, Counter(session_id for _, session_id in inserted))
+    record_rollups(inserted, status)
+
+
+def record_rollups(inserted, status):
+    """Add new attendance rows to their day/cohort/faculty rollup buckets"""
+    per_session = Counter(session_id for _, session_id in inserted)
+    buckets = Counter()
+    for row in db.session.execute(
+        select(AttendanceSession.id, AttendanceSession.session_date, AttendanceSession.branch,
+               AttendanceSession.year, AttendanceSession.faculty_id).where(AttendanceSession.id.in_(per_session))
+    ):
+        buckets[(row.session_date, row.branch, row.year, row.faculty_id)] += per_session[row.id]
+
+    column = AttendanceRollup.present_count if status == 'Present' else AttendanceRollup.absent_count
+    now = datetime.now(timezone.utc)
+    for (day, branch, year, faculty_id), amount in buckets.items():
+        bucket = (
+            AttendanceRollup.day == day,
+            AttendanceRollup.branch == branch,
+            AttendanceRollup.year == year,
+            AttendanceRollup.faculty_id == faculty_id
+        )
+        bump = update(AttendanceRollup).where(*bucket).values(
+            {column.key: column + amount, 'updated_at': now}
+        ).execution_options(synchronize_session=False)
+        if db.session.execute(bump).rowcount:
+            continue
+
+        # First rows of the bucket; if another transaction created it meanwhile, bump that one
+        stmt = insert_ignore(AttendanceRollup, ['day', 'branch', 'year', 'faculty_id'])
+        if stmt is None:
+            stmt = insert(AttendanceRollup)
+        values = {'day': day, 'branch': branch, 'year': year, 'faculty_id': faculty_id,
+                  'present_count': 0, 'absent_count': 0, 'updated_at': now, column.key: amount}
+        if not db.session.execute(stmt.values(values)).rowcount:
+            db.session.execute(bump)
+
+
+def record_session_started(session):
+    """Add a new session to its cohort's counters; the caller commits"""
+    db.session.execute(
+        update(StudentAttendanceSummary).where(StudentAttendanceSummary.student_id.in_(
+            select(Student.id).where(Student.branch == session.branch, Student.year == session.year)
+        )).values(total_sessions=StudentAttendanceSummary.total_sessions + 1).execution_options(
+            synchronize_session=False
+        )
+    )
+    db.session.execute(
+        insert_ignore(SessionAttendanceSummary, ['session_id']).from_select(
+            ['session_id', 'cohort_size', 'present_count'],
+            session_counts_query().where(AttendanceSession.id == session.id)
+        )
+    )
+
+
+def record_student_registered(student):
+    """Grow the cohort size of the new student's sessions; the caller commits"""
+    db.session.execute(
+        update(SessionAttendanceSummary).where(SessionAttendanceSummary.session_id.in_(
+            select(AttendanceSession.id).where(
+                AttendanceSession.branch == student.branch,
+                AttendanceSession.year == student.year
+            )
+        )).values(cohort_size=SessionAttendanceSummary.cohort_size + 1).execution_options(
+            synchronize_session=False
+        )
+    )
+
+
+def student_summary(student_id):
+    """Return a student's summary counters, building the row on first use"""
+    summary = db.session.get(StudentAttendanceSummary, student_id)
+    if summary is None:
+        db.session.execute(
+            insert_ignore(StudentAttendanceSummary, ['student_id']).from_select(
+                ['student_id', 'total_sessions', 'present_count', 'absent_count'],
+                student_counts_query().where(Student.id == student_id)
+            )
+        )
+        db.session.commit()
+        summary = db.session.get(StudentAttendanceSummary, student_id)
+    return summary
+
+
+def build_session_summaries(faculty_id):
+    """Build the summary rows missing for a faculty's sessions, committing if any were"""
+    missing = session_counts_query().outerjoin(
+        SessionAttendanceSummary, SessionAttendanceSummary.session_id == AttendanceSession.id
+    ).where(AttendanceSession.faculty_id == faculty_id, SessionAttendanceSummary.session_id.is_(None))
+    stmt = insert_ignore(SessionAttendanceSummary, ['session_id'])
+    if stmt is None:
+        stmt = insert(SessionAttendanceSummary)
+    if db.session.execute(stmt.from_select(['session_id', 'cohort_size', 'present_count'], missing)).rowcount:
+        db.session.commit()
+
+
+def rebuild_summaries():
+    """Recompute every summary row from the raw tables"""
+    db.session.execute(delete(StudentAttendanceSummary))
+    db.session.execute(delete(SessionAttendanceSummary))
+    db.session.execute(insert(StudentAttendanceSummary).from_select(
+        ['student_id', 'total_sessions', 'present_count', 'absent_count'], student_counts_query()
+    ))
+    db.session.execute(insert(SessionAttendanceSummary).from_select(
+        ['session_id', 'cohort_size', 'present_count'], session_counts_query()
+    ))
+    rebuild_rollups()
+
+
+def rebuild_rollups():
+    """Recompute the analytics rollups from the raw tables"""
+    db.session.execute(delete(AttendanceRollup))
+    db.session.execute(insert(AttendanceRollup).from_select(
+        ['day', 'branch', 'year', 'faculty_id', 'present_count', 'absent_count', 'updated_at'],
+        rollup_counts_query()
+    ))
+    db.session.commit()
+
+
+def check_summaries():
+    """Compare the summary rows with the raw tables and list the differences
+
+    Missing summary rows are not differences; they are built on first read.
+    Rollups have no lazy path, so missing buckets are reported.
+    """
+    mismatches = []
+    checks = (
+        (StudentAttendanceSummary.student_id, 'student', student_counts_query(),
+         ('total_sessions', 'present_count', 'absent_count')),
+        (SessionAttendanceSummary.session_id, 'session', session_counts_query(), ('cohort_size', 'present_count'))
+    )
+    for key_column, name, raw_query, columns in checks:
+        stored = {getattr(summary, key_column.key): summary for summary in db.session.query(key_column.class_)}
+        for row in db.session.execute(raw_query):
+            summary = stored.get(row.id)
+            if summary is None:
+                continue
+            for column in columns:
+                expected, actual = getattr(row, column), getattr(summary, column)
+                if expected != actual:
+                    mismatches.append(f"{name} {row.id}: {column} is {actual}, expected {expected}")
+
+    # Rollups only ever gain rows, so a bucket must exist for every day and cohort
+    stored = {(rollup.day, rollup.branch, rollup.year, rollup.faculty_id): rollup
+              for rollup in AttendanceRollup.query}
+    for row in db.session.execute(rollup_counts_query()):
+        key = (row.session_date, row.branch, row.year, row.faculty_id)
+        rollup = stored.pop(key, None)
+        if rollup is None:
+            mismatches.append(f"rollup {key}: missing")
+            continue
+        for column in ('present_count', 'absent_count'):
+            if getattr(row, column) != getattr(rollup, column):
+                mismatches.append(f"rollup {key}: {column} is {getattr(rollup, column)}, expected {getattr(row, column)}")
+    for key in stored:
+        mismatches.append(f"rollup {key}: no matching attendance")
+    return mismatches
+
+class AttendanceMarker:
+    """Group commits of concurrent frames into one marking transaction
+
+    The first thread to arrive becomes the leader and marks everything
+    queued while it works; the others wait for its result. A leader marks
+    one batch and then hands over to a thread whose request is still
+    queued, so no request waits behind more than one batch besides its own.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.leader_done = threading.Condition(self.lock)
+        self.pending = []
+        self.leader_active = False
+        self.transactions = 0
+        self.requests = 0
+
+    def mark(self, session_id, student_ids, students=None):
+        """Mark students present for a session and return their details by id"""
+        student_ids = set(student_ids)
+        if not student_ids:
+            return {}
+
+        future = Future()
+        with self.lock:
+            self.pending.append((session_id, student_ids, students, future))
+            while self.leader_active and not future.done():
+                self.leader_done.wait()
+            leader = not future.done()
+            if leader:
+                self.leader_active = True
+                batch, self.pending = self.pending, []
+
+        if leader:
+            try:
+                self.lead(batch)
+            finally:
+                with self.lock:
+                    self.leader_active = False
+                    self.leader_done.notify_all()
+        return future.result()
+
+    def lead(self, batch):
+        known = {}
+        for _, _, students, _ in batch:
+            known.update(students or {})
+        try:
+            students = mark_students_present([(session_id, ids) for session_id, ids, _, _ in batch], known)
+        except Exception as e:
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.transactions += 1
+        self.requests += len(batch)
+        for _, ids, _, future in batch:
+            future.set_result({student_id: students[student_id] for student_id in ids if student_id in students})
+
+
+class SessionRosterCache:
+    """The cohort's students and who is already marked, per live session
+
+    Rosters are loaded when a session starts (or on its first frame after a
+    restart) so frames only go to the database for students not marked yet.
+    """
+
+    def __init__(self, idle_timeout=3600):
+        self.idle_timeout = idle_timeout
+        self.rosters = {}
+        self.lock = threading.Lock()
+
+    def load(self, session):
+        """Cache the roster of an AttendanceSession"""
+        students = {
+            row.id: dict(row._mapping)
+            for row in db.session.execute(
+                select(*STUDENT_FIELDS).where(Student.branch == session.branch, Student.year == session.year)
+            )
+        }
+        marked = {
+            student_id for (student_id,) in db.session.execute(
+                select(Attendance.student_id).where(Attendance.session_id == session.id)
+            )
+        }
+        roster = {'students': students, 'marked': marked, 'last_seen': time.time()}
+        with self.lock:
+            self.rosters[session.id] = roster
+        return roster
+
+    def get(self, session_id):
+        """Return the cached roster, loading it if needed, or None for unknown sessions"""
+        self.evict_idle()
+        try:
+            session_id = int(session_id)
+        except (TypeError, ValueError):
+            return None
+        with self.lock:
+            roster = self.rosters.get(session_id)
+        if roster is None:
+            session = db.session.get(AttendanceSession, session_id)
+            if session is None:
+                return None
+            roster = self.load(session)
+        roster['last_seen'] = time.time()
+        return roster
+
+    def evict(self, session_id):
+        with self.lock:
+            self.rosters.pop(session_id, None)
+
+    def evict_idle(self):
+        cutoff = time.time() - self.idle_timeout
+        with self.lock:
+            for session_id in [key for key, roster in self.rosters.items() if roster['last_seen'] < cutoff]:
+                del self.rosters[session_id]
+
+
+attendance_marker = AttendanceMarker()
+session_rosters = SessionRosterCache()
+
+
+def mark_session_students(session_id, student_ids):
+    """Mark recognized students present, answering from the session roster
+
+    Only students not yet marked reach the database. Students outside the
+    session's cohort are still looked up and marked as before.
+    """
+    # Legacy clients send ids as strings, recognizers as numpy integers
+    student_ids = {int(student_id) for student_id in student_ids}
+    roster = session_rosters.get(session_id)
+    if roster is None:
+        return attendance_marker.mark(session_id, student_ids)
+
+    new_ids = student_ids - roster['marked']
+    students = {student_id: roster['students'][student_id] for student_id in student_ids & set(roster['students'])}
+    if new_ids:
+        marked = attendance_marker.mark(session_id, new_ids, roster['students'])
+        roster['marked'].update(marked)
+        students.update(marked)
+    return students
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, joinedload
+
+from models import db, User, Student, Faculty, Admin
+
+IDENTITY_CACHE_SIZE = 10000
+
+
+def identity_query(user_id):
+    """A user with their student, faculty or admin profile, in one joined query"""
+    return select(User).options(
+        joinedload(User.student), joinedload(User.faculty), joinedload(User.admin)
+    ).where(User.id == user_id)
+
+
+class IdentityCache:
+    """Logged-in users with their role profile, kept for ttl seconds per process
+
+    Every request would otherwise load the user and then their profile.
+    Cached users are detached copies loaded in their own session; each
+    request merges one into db.session without querying. Changes to a
+    user or profile made through the ORM in this process evict it at once;
+    other processes see them when the entry expires, so keep ttl short.
+    A ttl of 0 turns the cache off.
+    """
+
+    def __init__(self, ttl=0, max_size=IDENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.users = OrderedDict()  # user id -> (expires at, detached user)
+        self.lock = threading.Lock()
+
+    def load(self, user_id):
+        """The user for Flask-Login's user_loader, attached to db.session"""
+        if self.ttl <= 0:
+            return db.session.execute(identity_query(user_id)).unique().scalar_one_or_none()
+
+        with self.lock:
+            cached = self.users.get(user_id)
+            if cached and cached[0] > time.monotonic():
+                self.users.move_to_end(user_id)
+                user = cached[1]
+            else:
+                user = None
+
+        if user is None:
+            with Session(db.engine, expire_on_commit=False) as session:
+                user = session.execute(identity_query(user_id)).unique().scalar_one_or_none()
+                session.expunge_all()
+            if user is None:
+                return None
+            with self.lock:
+                self.users[user_id] = (time.monotonic() + self.ttl, user)
+                self.users.move_to_end(user_id)
+                while len(self.users) > self.max_size:
+                    self.users.popitem(last=False)
+
+        # load=False copies the cached state over without a SELECT
+        return db.session.merge(user, load=False)
+
+    def evict(self, user_id):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+
+identity_cache = IdentityCache()
+
+
+def identity_changed(mapper, connection, target):
+    """Evict the user behind a changed user or profile row"""
+    user_id = target.id if isinstance(target, User) else target.user_id
+    identity_cache.evict(user_id)
+    # Evict again on commit, in case a request re-cached the old row meanwhile
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_identities', set()).add(user_id)
+
+
+for model in (User, Student, Faculty, Admin):
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, identity_changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def evict_committed_identities(session):
+    for user_id in session.info.pop('changed_identities', ()):
+        identity_cache.evict(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_rolled_back_identities(session):
+    session.info.pop('changed_identities', None)
@@ -0,0 +1,79 @@
+"""Finalizing a session's absentees, ORM loop vs one INSERT ... SELECT.
+
+A tenth of each cohort is marked present before the session completes.
+
+Run from the repository root:
+
+    python benchmarks/bench_absentee_finalization.py
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_utils import mark_absentees
+from models import db, User, Student, Faculty, AttendanceSession, Attendance
+
+COHORT_SIZES = [100, 500, 1000, 5000]
+
+
+def mark_absentees_orm(session):
+    """The loop complete_attendance used to run"""
+    students = Student.query.filter_by(branch=session.branch, year=session.year).all()
+    present_student_ids = [att.student_id for att in session.attendances]
+    for student in students:
+        if student.id not in present_student_ids:
+            db.session.add(Attendance(student_id=student.id, session_id=session.id, status='Absent'))
+
+
+def main():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='faculty@bench', user_type='faculty', password_hash='-')
+        db.session.add(user)
+        db.session.flush()
+        faculty = Faculty(user_id=user.id, name='Faculty', department='CSE', employee_id='E1')
+        db.session.add(faculty)
+        db.session.commit()
+
+        print(f"{'cohort':>7} {'orm (ms)':>10} {'set-based (ms)':>15} {'rerun rows':>11} {'rows agree':>11}")
+        for size in COHORT_SIZES:
+            year = f'Y{size}'
+            db.session.add_all(Student(user_id=user.id, name=f'Student {i}', roll_number=f'{year}-{i}',
+                                       branch='CSE', year=year) for i in range(size))
+            db.session.commit()
+            student_ids = [student_id for (student_id,) in db.session.query(Student.id).filter_by(year=year)]
+
+            timings, rows = [], []
+            for finalize in (mark_absentees_orm, mark_absentees):
+                session = AttendanceSession(faculty_id=faculty.id, class_name='C', branch='CSE', year=year,
+                                            session_date=date.today())
+                db.session.add(session)
+                db.session.flush()
+                db.session.add_all(Attendance(student_id=student_id, session_id=session.id, status='Present')
+                                   for student_id in student_ids[::10])
+                db.session.commit()
+                db.session.expire_all()
+
+                start = time.perf_counter()
+                finalize(session)
+                db.session.commit()
+                timings.append((time.perf_counter() - start) * 1000)
+                rows.append(Attendance.query.filter_by(session_id=session.id, status='Absent').count())
+
+            rerun = mark_absentees(session)
+            db.session.commit()
+            print(f"{size:>7} {timings[0]:>10.1f} {timings[1]:>15.1f} {rerun:>11} {str(rows[0] == rows[1]):>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Queries, commits and time to mark a 40-face frame, per student vs set-based.
+
+Also runs concurrent frames through AttendanceMarker to show how many
+transactions the group commit folds them into.
+
+Run from the repository root:
+
+    python benchmarks/bench_attendance_marking.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+from flask import Flask
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_utils import AttendanceMarker, mark_students_present
+from models import db, User, Student, Faculty, AttendanceSession, Attendance
+
+STUDENTS = 40
+CONCURRENT_FRAMES = 16
+
+
+def mark_per_student(session_id, student_ids):
+    """The marking loop take_attendance used to run"""
+    for student_id in student_ids:
+        student = Student.query.get(student_id)
+        if student:
+            existing = Attendance.query.filter_by(student_id=student.id, session_id=session_id).first()
+            if not existing:
+                db.session.add(Attendance(student_id=student.id, session_id=session_id, status='Present'))
+                db.session.commit()
+
+
+def main():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='faculty@bench', user_type='faculty', password_hash='-')
+        db.session.add(user)
+        db.session.flush()
+        faculty = Faculty(user_id=user.id, name='Faculty', department='CSE', employee_id='E1')
+        db.session.add(faculty)
+        for i in range(STUDENTS):
+            db.session.add(Student(user_id=user.id, name=f'Student {i}', roll_number=f'R{i}', branch='CSE', year='1st'))
+        db.session.flush()
+        sessions = []
+        for _ in range(2 + CONCURRENT_FRAMES):
+            session = AttendanceSession(faculty_id=faculty.id, class_name='C', branch='CSE', year='1st',
+                                        session_date=date.today())
+            db.session.add(session)
+            sessions.append(session)
+        db.session.commit()
+        session_ids = [session.id for session in sessions]
+        student_ids = [student_id for (student_id,) in db.session.query(Student.id)]
+
+        statements = []
+        commits = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(1))
+        event.listen(db.engine, 'commit', lambda *args: commits.append(1))
+
+        print(f"{'':>20} {'queries':>8} {'commits':>8} {'ms':>8}")
+        for name, mark, session_id in (('per student', mark_per_student, session_ids[0]),
+                                       ('set-based', lambda s, ids: mark_students_present([(s, ids)]), session_ids[1])):
+            for label in ('first', 'repeat'):
+                statements.clear()
+                commits.clear()
+                start = time.perf_counter()
+                mark(session_id, student_ids)
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"{name + ' ' + label:>20} {len(statements):>8} {len(commits):>8} {elapsed:>8.1f}")
+        db.session.remove()
+
+    marker = AttendanceMarker()
+    barrier = threading.Barrier(CONCURRENT_FRAMES)
+
+    def frame(session_id):
+        with app.app_context():
+            barrier.wait()
+            marker.mark(session_id, student_ids)
+
+    threads = [threading.Thread(target=frame, args=(session_id,)) for session_id in session_ids[2:]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        marked = Attendance.query.filter(Attendance.session_id.in_(session_ids[2:])).count()
+    print(f"{CONCURRENT_FRAMES} concurrent frames: {marker.transactions} transactions, "
+          f"{marked} rows marked")
+
+
+if __name__ == '__main__':
+    main()
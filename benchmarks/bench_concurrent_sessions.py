@@ -0,0 +1,168 @@
+"""Twenty classrooms taking attendance at once against one database.
+
+Each session runs in its own process, as it would under a multi-worker
+server: it starts a session, marks a few students present per frame while
+reading the session counters back, then finalizes the absentees. The
+plain SQLite setup the app used to have (rollback journal, synchronous
+FULL, 5 s lock timeout) is compared with the tuned profile from config.py
+(WAL, synchronous NORMAL, 30 s busy timeout).
+
+Run from the repository root:
+
+    python benchmarks/bench_concurrent_sessions.py [frames_per_session]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date
+
+from flask import Flask
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_utils import mark_absentees, mark_students_present, record_session_started
+from config import Config, configure_database, database_engine_options
+from models import db, User, Student, Faculty, AttendanceSession, SessionAttendanceSummary
+
+SESSIONS = 20
+COHORT_SIZE = 60
+FACES_PER_FRAME = 3
+
+PROFILES = {
+    'plain': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT': 5},
+    'tuned': {'SQLITE_JOURNAL_MODE': Config.SQLITE_JOURNAL_MODE, 'SQLITE_SYNCHRONOUS': Config.SQLITE_SYNCHRONOUS,
+              'SQLITE_BUSY_TIMEOUT': Config.SQLITE_BUSY_TIMEOUT},
+}
+
+
+def make_app(uri, profile):
+    app = Flask(__name__)
+    app.config.update(PROFILES[profile])
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options(
+        uri, app.config['SQLITE_BUSY_TIMEOUT'], Config.DB_POOL_SIZE, Config.DB_MAX_OVERFLOW, Config.DB_POOL_TIMEOUT,
+        Config.DB_POOL_RECYCLE, Config.DB_STATEMENT_TIMEOUT
+    )
+    db.init_app(app)
+    with app.app_context():
+        configure_database(db.engine, app.config)
+    return app
+
+
+def seed(app):
+    """One faculty member and a cohort of students per session"""
+    with app.app_context():
+        db.create_all()
+        user = User(email='faculty@bench', user_type='faculty', password_hash='-')
+        db.session.add(user)
+        db.session.flush()
+        faculty = Faculty(user_id=user.id, name='Faculty', department='CSE', employee_id='E1')
+        db.session.add(faculty)
+        for cohort in range(SESSIONS):
+            db.session.add_all(Student(user_id=user.id, name=f'Student {i}', roll_number=f'{cohort}-{i}',
+                                       branch='CSE', year=f'Y{cohort}') for i in range(COHORT_SIZE))
+        db.session.commit()
+        faculty_id = faculty.id
+        cohorts = defaultdict(list)
+        for student_id, year in db.session.query(Student.id, Student.year):
+            cohorts[year].append(student_id)
+        # Forked sessions must not share the seeding connections
+        db.session.close()
+        db.engine.dispose()
+        return faculty_id, dict(cohorts)
+
+
+def run_session(uri, profile, faculty_id, year, student_ids, frames, start, results):
+    app = make_app(uri, profile)
+    latencies, errors = defaultdict(list), Counter()
+
+    def timed(kind, operation):
+        began = time.perf_counter()
+        try:
+            operation()
+        except OperationalError as e:
+            db.session.rollback()
+            errors[str(e.orig)] += 1
+            return
+        latencies[kind].append(time.perf_counter() - began)
+
+    def start_session():
+        session = AttendanceSession(faculty_id=faculty_id, class_name=year, branch='CSE', year=year,
+                                    session_date=date.today())
+        db.session.add(session)
+        db.session.flush()
+        record_session_started(session)
+        db.session.commit()
+        sessions.append(session)
+
+    def read_counters():
+        db.session.execute(select(SessionAttendanceSummary).where(
+            SessionAttendanceSummary.session_id == sessions[0].id)).all()
+        db.session.commit()
+
+    with app.app_context():
+        sessions = []
+        start.wait()
+        timed('start', start_session)
+        if sessions:
+            session_id = sessions[0].id
+            for _ in range(frames):
+                ids = random.sample(student_ids, FACES_PER_FRAME)
+                timed('mark', lambda: mark_students_present([(session_id, ids)]))
+                timed('read', read_counters)
+            timed('finalize', lambda: (mark_absentees(sessions[0]), db.session.commit()))
+    results.put((dict(latencies), errors))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else float('nan')
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    context = multiprocessing.get_context('fork')
+
+    print(f"{SESSIONS} concurrent sessions, {frames} frames each")
+    print(f"{'profile':>8} {'wall (s)':>9} {'ops/s':>7} {'mark p50/p95/max (ms)':>24} "
+          f"{'read p50/p95/max (ms)':>24} {'errors':>7}")
+    for profile in PROFILES:
+        uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        faculty_id, cohorts = seed(make_app(uri, profile))
+
+        start = context.Barrier(SESSIONS + 1)
+        results = context.Queue()
+        workers = [context.Process(target=run_session, args=(uri, profile, faculty_id, year, student_ids,
+                                                             frames, start, results))
+                   for year, student_ids in cohorts.items()]
+        for worker in workers:
+            worker.start()
+        start.wait()
+        began = time.perf_counter()
+        outcomes = [results.get() for _ in workers]
+        wall = time.perf_counter() - began
+        for worker in workers:
+            worker.join()
+
+        latencies, errors = defaultdict(list), Counter()
+        for session_latencies, session_errors in outcomes:
+            for kind, values in session_latencies.items():
+                latencies[kind].extend(values)
+            errors.update(session_errors)
+        ops = sum(len(values) for values in latencies.values())
+        cells = ['/'.join(f"{percentile(latencies[kind], q):.0f}" for q in (0.5, 0.95, 1.0))
+                 for kind in ('mark', 'read')]
+        print(f"{profile:>8} {wall:>9.2f} {ops / wall:>7.0f} {cells[0]:>24} {cells[1]:>24} "
+              f"{sum(errors.values()):>7}")
+        for message, count in errors.items():
+            print(f"{'':>9} {count} x {message}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Face detection time and recall at several detection widths.
+
+Recall is measured against detections on the full-resolution frame. With no
+arguments a synthetic 1080p classroom frame is tiled from the sample store.
+
+Run from the repository root:
+
+    python benchmarks/bench_detection_scale.py [image ...]
+"""
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_store import FaceSampleStore
+from face_utils import FaceRecognitionSystem
+
+DETECTION_WIDTHS = [0, 1280, 960, 640, 480, 320]
+REPEATS = 3
+
+
+def synthetic_frame():
+    store = FaceSampleStore('face_data')
+    faces, _ = store.samples()
+    if not faces:
+        faces = [cv2.imread(os.path.join('face_data', name), cv2.IMREAD_GRAYSCALE)
+                 for name in os.listdir('face_data') if name.endswith('.jpg')]
+
+    frame = np.full((1080, 1920), 128, dtype=np.uint8)
+    for row, size in enumerate([60, 90, 120, 160]):
+        for col in range(8):
+            face = cv2.resize(faces[(row * 8 + col) % len(faces)], (size, size))
+            y, x = 40 + row * 250, 40 + col * 235
+            frame[y:y+size, x:x+size] = face
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def recall(reference, faces):
+    if len(reference) == 0:
+        return 1.0
+    found = sum(1 for ref in reference if any(iou(ref, face) >= 0.5 for face in faces))
+    return found / len(reference)
+
+
+def main():
+    if len(sys.argv) > 1:
+        frames = [cv2.imread(path) for path in sys.argv[1:]]
+    else:
+        frames = [synthetic_frame()]
+
+    system = FaceRecognitionSystem()
+    system.detection_width = 0
+    references = [system.detect_faces(frame)[0] for frame in frames]
+    print(f"{len(frames)} frame(s), {sum(len(r) for r in references)} faces at full resolution")
+    print(f"{'width':>6} {'detect (ms)':>12} {'recall':>7}")
+
+    for width in DETECTION_WIDTHS:
+        system.detection_width = width
+        elapsed = 0.0
+        recalls = []
+        for frame, reference in zip(frames, references):
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                faces, _ = system.detect_faces(frame)
+            elapsed += (time.perf_counter() - start) / REPEATS
+            recalls.append(recall(reference, faces))
+        label = 'full' if width == 0 else str(width)
+        print(f"{label:>6} {elapsed / len(frames) * 1000:>12.1f} {np.mean(recalls):>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
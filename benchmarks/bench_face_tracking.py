@@ -0,0 +1,99 @@
+"""Predictions per frame over a simulated 50-minute session, with and without tracking.
+
+A 1 fps camera watches 40 seated students who jitter in place, are missed by
+the detector now and then, and occasionally get up, move or arrive late;
+now and then two students swap seats. Each face is drawn with its
+student's id as pixel value, so the benchmark also counts faces reported
+under someone else's id.
+
+Run from the repository root:
+
+    python benchmarks/bench_face_tracking.py
+"""
+import os
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_utils import FaceRecognitionSystem, FaceTracker
+
+FRAMES = 50 * 60
+STUDENTS = 40
+MISS_RATE = 0.05
+MOVE_RATE = 0.002
+SWAP_RATE = 0.002
+
+
+def simulate(use_tracker, seed=0):
+    rng = np.random.default_rng(seed)
+    seats = [(60 + (i % 8) * 220, 80 + (i // 8) * 190) for i in range(STUDENTS)]
+    positions = {i: np.array(seat, dtype=float) for i, seat in enumerate(seats)}
+    present = set(range(STUDENTS - 5))
+    gray = np.zeros((1080, 1920), dtype=np.uint8)
+
+    system = FaceRecognitionSystem()
+    system.model_trained = True
+    predicted = []
+    truth = []
+
+    def detect_faces(frame, camera_id=None):
+        boxes = []
+        gray[:] = 0
+        for student in sorted(present):
+            if rng.random() < MISS_RATE:
+                continue
+            x, y = np.clip(positions[student] + rng.normal(0, 3, 2), 0, (1920 - 90, 1080 - 90)).astype(int)
+            gray[y:y + 90, x:x + 90] = student + 1
+            boxes.append((x, y, 90, 90))
+        # Whoever is drawn on top of overlapping faces is the right answer
+        truth.extend(int(np.median(gray[y:y + h, x:x + w])) for x, y, w, h in boxes)
+        return np.array(boxes, dtype=np.int32).reshape(-1, 4), gray
+
+    def predict_faces(recognizer, face_rois, allowed_labels=None):
+        predicted.append(len(face_rois))
+        return [(int(np.median(roi)), 30.0) for roi in face_rois]
+
+    system.detect_faces = detect_faces
+    system.predict_faces = predict_faces
+    tracker = FaceTracker(system.track_resolve_confidence) if use_tracker else None
+
+    mislabeled = 0
+    returning = defaultdict(set)
+    for frame in range(FRAMES):
+        # Late arrivals, students stepping out and moving seats
+        if frame % 300 == 0 and len(present) < STUDENTS:
+            present.add(max(set(range(STUDENTS)) - present))
+        for student in list(present):
+            if rng.random() < MOVE_RATE:
+                # Moves stay in the room and never land on someone's seat
+                target = np.clip(positions[student] + rng.normal(0, 150, 2), 0, (1920 - 90, 1080 - 90))
+                if all(np.abs(target - positions[other]).max() >= 100 for other in positions if other != student):
+                    positions[student] = target
+            if rng.random() < SWAP_RATE:
+                # Both get up for a few frames and come back in each other's seat
+                other = rng.choice(sorted(present - {student}))
+                positions[student], positions[other] = positions[other], positions[student]
+                present -= {student, other}
+                returning[frame + rng.integers(2, 10)] |= {student, other}
+        present |= returning.pop(frame, set())
+        truth.clear()
+        faces = system.recognize_face(None, tracker=tracker)
+        mislabeled += sum(face['face_id'] != student for face, student in zip(faces, truth))
+
+    return np.array(predicted), mislabeled
+
+
+def main():
+    print(f"{FRAMES} frames, {STUDENTS} students")
+    print(f"{'mode':>10} {'total':>8} {'per frame':>10} {'max':>5} {'mislabeled':>11}")
+    for use_tracker in (False, True):
+        predicted, mislabeled = simulate(use_tracker)
+        mode = 'tracked' if use_tracker else 'untracked'
+        print(f"{mode:>10} {predicted.sum():>8} {predicted.mean():>10.2f} {predicted.max():>5} {mislabeled:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Queries per faculty CSV/PDF report download as the number of sessions grows.
+
+Both reports are fed by one grouped query, so the count must not depend
+on how many sessions the faculty member has; the script exits non-zero
+if it does.
+
+Run from the repository root:
+
+    python benchmarks/bench_faculty_reports.py
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+from sqlalchemy import event
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db, User, Student, Faculty, AttendanceSession, Attendance
+
+SESSION_COUNTS = [10, 100, 300]
+COHORT_SIZE = 40
+REPORTS = ['/faculty/download-report', '/faculty/download-pdf-report']
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        user = User(email='faculty@bench', user_type='faculty')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+        faculty = Faculty(user_id=user.id, name='Faculty', department='CSE', employee_id='E1')
+        # The cohorts share one account; the logged-in user only needs a faculty profile
+        students_user = User(email='students@bench', user_type='student', password_hash='-')
+        db.session.add_all([faculty, students_user])
+        db.session.flush()
+        for year in ('1st', '2nd'):
+            db.session.add_all(Student(user_id=students_user.id, name=f'Student {i}', roll_number=f'{year}-{i}',
+                                       branch='CSE', year=year) for i in range(COHORT_SIZE))
+        db.session.commit()
+        faculty_id = faculty.id
+        student_ids = {year: [student_id for (student_id,) in db.session.query(Student.id).filter_by(year=year)]
+                       for year in ('1st', '2nd')}
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(1))
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'faculty@bench', 'password': 'bench', 'user_type': 'faculty'})
+
+    counts = {report: set() for report in REPORTS}
+    created = 0
+    print(f"{'sessions':>9} " + ' '.join(f"{report.rsplit('/', 1)[1] + ' (queries, ms)':>30}" for report in REPORTS))
+    for session_count in SESSION_COUNTS:
+        with app.app_context():
+            for i in range(created, session_count):
+                year = ('1st', '2nd')[i % 2]
+                session = AttendanceSession(faculty_id=faculty_id, class_name=f'C{i}', branch='CSE', year=year,
+                                            session_date=date.today(), is_completed=True)
+                db.session.add(session)
+                db.session.flush()
+                db.session.add_all(Attendance(student_id=student_id, session_id=session.id,
+                                              status='Present' if j % 3 else 'Absent')
+                                   for j, student_id in enumerate(student_ids[year]))
+            db.session.commit()
+        created = session_count
+
+        cells = []
+        for report in REPORTS:
+            statements.clear()
+            start = time.perf_counter()
+            response = client.get(report)
+            elapsed = (time.perf_counter() - start) * 1000
+            assert response.status_code == 200, response.status_code
+            counts[report].add(len(statements))
+            cells.append(f"{len(statements):>22}, {elapsed:>6.1f}")
+        print(f"{session_count:>9} " + ' '.join(cells))
+
+    for report, seen in counts.items():
+        if len(seen) != 1:
+            sys.exit(f"{report}: query count varies with the number of sessions: {sorted(seen)}")
+    print("query counts are constant")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""LBPHFaceRecognizer.predict vs the vectorized HistogramMatcher.
+
+Galleries are built from warped, resized and noised copies of the faces in
+the sample store, so every entry looks alike and the search cannot prune
+easily. Checks that both engines agree on every label.
+
+Run from the repository root:
+
+    python benchmarks/bench_histogram_matcher.py [gallery_size ...]
+"""
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_matcher import HistogramMatcher
+from face_store import FaceSampleStore
+
+FACES_PER_FRAME = 40
+
+
+def base_faces():
+    faces, _ = FaceSampleStore('face_data').samples()
+    if not faces:
+        faces = [cv2.imread(os.path.join('face_data', name), cv2.IMREAD_GRAYSCALE)
+                 for name in os.listdir('face_data') if name.endswith('.jpg')]
+    return faces
+
+
+def make_face(base, i, rng):
+    height, width = base.shape
+    rotation = cv2.getRotationMatrix2D((width / 2, height / 2), (i % 37) - 18, 1 + ((i % 11) - 5) / 50)
+    face = cv2.warpAffine(base, rotation, (width, height))
+    size = int(rng.integers(90, 160))
+    face = cv2.resize(face, (size, size)).astype(np.int16)
+    return np.clip(face + rng.integers(-20, 20, face.shape), 0, 255).astype(np.uint8)
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 10000]
+    rng = np.random.default_rng(0)
+    bases = base_faces()
+
+    print(f"{'gallery':>8} {'opencv (ms/face)':>17} {'numpy (ms/face)':>16} {'numpy batch (ms/face)':>22} {'labels agree':>13}")
+    for size in sizes:
+        gallery = [make_face(bases[i % len(bases)], i, rng) for i in range(size)]
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.train(gallery, np.arange(size) // 3)
+        del gallery
+        matcher = HistogramMatcher.from_recognizer(recognizer)
+
+        faces = [make_face(bases[i % len(bases)], i, rng) for i in range(FACES_PER_FRAME)]
+
+        start = time.perf_counter()
+        expected = [recognizer.predict(face) for face in faces]
+        opencv_time = (time.perf_counter() - start) / len(faces)
+
+        start = time.perf_counter()
+        single = [matcher.predict(face) for face in faces]
+        numpy_time = (time.perf_counter() - start) / len(faces)
+
+        start = time.perf_counter()
+        batch = matcher.predict_batch(faces)
+        batch_time = (time.perf_counter() - start) / len(faces)
+
+        agree = all(e[0] == s[0] == b[0] for e, s, b in zip(expected, single, batch))
+        print(f"{size:>8} {opencv_time * 1000:>17.1f} {numpy_time * 1000:>16.1f} {batch_time * 1000:>22.1f} {str(agree):>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Time per face registration: full retrain vs incremental update.
+
+Both include publishing the new model for recognition. A full retrain is
+also saved to disk in the background; the benchmark waits for that save,
+since it competes with the next registration for CPU. The first update
+after startup builds the spare model the two-model swap needs, so it is
+shown separately.
+
+Run from the repository root:
+
+    python benchmarks/bench_incremental_training.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_store import FaceSampleStore
+from face_utils import FaceRecognitionSystem
+
+GALLERY_SIZES = [50, 200, 800]
+REGISTRATIONS = 5
+
+
+def make_system(workdir, gallery_size, rng):
+    system = FaceRecognitionSystem()
+    system.face_dir = os.path.join(workdir, 'face_data')
+    system.model_file = os.path.join(workdir, 'face_model.yml')
+    system.model_dir = os.path.join(workdir, 'face_models')
+    system.sample_store = FaceSampleStore(system.face_dir)
+    system.rebuild_interval = 10 ** 9
+    for i in range(gallery_size):
+        system.sample_store.append(i + 1, rng.integers(0, 256, (100, 100), dtype=np.uint8))
+    system.train_model(save=False)
+    return system
+
+
+def time_registrations(system, rng, incremental):
+    timings = []
+    for i in range(REGISTRATIONS):
+        start = time.perf_counter()
+        face = rng.integers(0, 256, (100, 100), dtype=np.uint8)
+        label = 100000 + i
+        system.sample_store.append(label, face)
+        if incremental:
+            system.update_model() and system.publish_model()
+        else:
+            system.train_model()
+            system.model_saver.join()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    rng = np.random.default_rng(0)
+    results = []
+    for size in GALLERY_SIZES:
+        row = [size]
+        for incremental in (False, True):
+            with tempfile.TemporaryDirectory() as workdir:
+                system = make_system(workdir, size, rng)
+                row.append(time_registrations(system, rng, incremental))
+        results.append(row)
+
+    print(f"{'gallery':>8} {'full retrain (ms)':>18} {'incremental first (ms)':>23} {'incremental (ms)':>17}")
+    for size, full, incremental in results:
+        print(f"{size:>8} {np.mean(full) * 1000:>18.1f} {incremental[0] * 1000:>23.1f} "
+              f"{np.mean(incremental[1:]) * 1000:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
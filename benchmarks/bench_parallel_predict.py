@@ -0,0 +1,50 @@
+"""Frame prediction latency for 1, 10 and 40 faces across thread pool sizes.
+
+Run from the repository root:
+
+    python benchmarks/bench_parallel_predict.py [gallery_size]
+"""
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_utils import FaceRecognitionSystem
+
+FACES_PER_FRAME = [1, 10, 40]
+REPEATS = 5
+
+
+def main():
+    gallery_size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = np.random.default_rng(0)
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    gallery = [rng.integers(0, 256, (100, 100), dtype=np.uint8) for _ in range(gallery_size)]
+    recognizer.train(gallery, np.arange(gallery_size))
+
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    print(f"gallery: {gallery_size} samples, cpus: {os.cpu_count()}")
+    print(f"{'faces':>6} " + ' '.join(f"{f'{n} workers (ms)':>16}" for n in worker_counts))
+
+    for face_count in FACES_PER_FRAME:
+        face_rois = [rng.integers(0, 256, (100, 100), dtype=np.uint8) for _ in range(face_count)]
+        timings = []
+        for workers in worker_counts:
+            system = FaceRecognitionSystem()
+            system.predict_workers = workers
+            system.predict_faces(recognizer, face_rois)  # warm up the pool
+
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                system.predict_faces(recognizer, face_rois)
+            timings.append((time.perf_counter() - start) / REPEATS)
+        print(f"{face_count:>6} " + ' '.join(f"{t * 1000:>16.1f}" for t in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Frame throughput and memory of recognition_service.py across worker process counts.
+
+Concurrent clients each send frames of 10 faces; every worker maps the
+same shared gallery, so memory stays flat while throughput should grow
+with the number of cores. RSS and PSS (resident memory with shared pages
+split between the processes mapping them) are read from
+/proc/<pid>/smaps_rollup for the service process and averaged over its
+workers; Linux only.
+
+Run from the repository root:
+
+    python benchmarks/bench_recognition_service.py [gallery_size]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_store import FaceSampleStore
+from recognition_service import RecognitionClient, RecognitionService
+
+CLIENTS = 8
+FRAMES_PER_CLIENT = 10
+FACES_PER_FRAME = 10
+# Registered after startup, so the service is measured as it runs after an update
+NEW_SAMPLES = 10
+
+
+def memory_mb(pid):
+    """(RSS, PSS) of a process in MB, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as rollup:
+            fields = dict(line.split()[:2] for line in rollup if line.split()[0] in ('Rss:', 'Pss:'))
+    except OSError:
+        return None
+    return int(fields['Rss:']) / 1024, int(fields['Pss:']) / 1024
+
+
+def format_memory(usage):
+    return f"{usage[0]:>6.1f}/{usage[1]:<6.1f}" if usage else f"{'n/a':^13}"
+
+
+def run_service(workdir, workers):
+    """Time one service and print its row; runs in a fresh process per worker count"""
+    rng = np.random.default_rng(1)
+    frame = [rng.integers(0, 256, (100, 100), dtype=np.uint8) for _ in range(FACES_PER_FRAME)]
+    face_dir = os.path.join(workdir, f'face_data-{workers}')
+    shutil.copytree(os.path.join(workdir, 'face_data'), face_dir)
+    # Throughput is measured, not latency, so frames may queue for long
+    service = RecognitionService(os.path.join(workdir, f'service-{workers}.sock'), b'bench',
+                                 workers=workers, model_dir=os.path.join(workdir, f'face_models-{workers}'),
+                                 face_dir=face_dir, poll_interval=1, timeout=300)
+    service.start()
+    store = FaceSampleStore(face_dir)
+    for label in range(NEW_SAMPLES):
+        store.append(label, rng.integers(0, 256, (100, 100), dtype=np.uint8))
+    while service.status()['trained_samples'] != len(store):
+        time.sleep(0.5)
+    if service.system.model_saver is not None:
+        service.system.model_saver.join()
+    client = RecognitionClient(service.address, b'bench', timeout=310)
+    client.predict(frame)  # wait for the workers to attach
+    # Frames submitted before the update are done, so drop the superseded gallery now
+    service.release_retired(0)
+
+    def run_client():
+        for _ in range(FRAMES_PER_CLIENT):
+            client.predict(frame)
+
+    threads = [threading.Thread(target=run_client) for _ in range(CLIENTS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    service_memory = memory_mb(os.getpid())
+    worker_memory = [memory_mb(process.pid) for process in service.processes]
+    service.stop()
+
+    worker_average, total_pss = None, 'n/a'
+    if service_memory and all(worker_memory):
+        worker_average = tuple(np.mean(worker_memory, axis=0))
+        total_pss = f"{service_memory[1] + sum(pss for _, pss in worker_memory):.1f}"
+    print(f"{workers:>8} {CLIENTS * FRAMES_PER_CLIENT / elapsed:>10.1f} {format_memory(service_memory):>19} "
+          f"{format_memory(worker_average):>18} {total_pss:>13}", flush=True)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        return run_service(sys.argv[2], int(sys.argv[3]))
+
+    gallery_size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = np.random.default_rng(0)
+    workdir = tempfile.mkdtemp()
+
+    # The service trains its gallery from the sample store on startup
+    store = FaceSampleStore(os.path.join(workdir, 'face_data'))
+    for label in range(gallery_size):
+        store.append(label, rng.integers(0, 256, (100, 100), dtype=np.uint8))
+
+    print(f"gallery: {gallery_size} samples, cpus: {os.cpu_count()}")
+    print(f"{'workers':>8} {'frames/s':>10} {'service RSS/PSS MB':>19} {'worker RSS/PSS MB':>18} {'total PSS MB':>13}")
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        # A fresh service process each time, so memory left by the last one is not counted
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--run', workdir, str(workers)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Peak Python memory and time to first byte of the streamed student CSV report.
+
+Peak memory should stay flat as the student's attendance history grows.
+
+Run from the repository root:
+
+    python benchmarks/bench_streaming_reports.py [max_rows]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db, User, Student, Faculty, AttendanceSession, Attendance
+
+ROW_COUNTS = [100, 10000, 100000, 1000000]
+INSERT_BATCH = 50000
+
+
+def add_history(student_id, faculty_id, start, stop):
+    """Give the student one attendance row per new session, via Core inserts"""
+    first_day = date(2000, 1, 1)
+    now = datetime.now(timezone.utc)
+    for batch_start in range(start, stop, INSERT_BATCH):
+        batch = range(batch_start, min(stop, batch_start + INSERT_BATCH))
+        db.session.execute(insert(AttendanceSession), [{
+            'id': i + 1, 'faculty_id': faculty_id, 'class_name': f'C{i}', 'branch': 'CSE', 'year': '1st',
+            'session_date': first_day + timedelta(days=i % 9000), 'start_time': now, 'is_completed': True
+        } for i in batch])
+        db.session.execute(insert(Attendance), [{
+            'student_id': student_id, 'session_id': i + 1, 'status': 'Present' if i % 4 else 'Absent',
+            'marked_at': now
+        } for i in batch])
+    db.session.commit()
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with app.app_context():
+        db.create_all()
+        user = User(email='student@bench', user_type='student')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+        student = Student(user_id=user.id, name='Student', roll_number='R1', branch='CSE', year='1st')
+        faculty = Faculty(user_id=user.id, name='Faculty', department='CSE', employee_id='E1')
+        db.session.add_all([student, faculty])
+        db.session.commit()
+        student_id, faculty_id = student.id, faculty.id
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'student@bench', 'password': 'bench', 'user_type': 'student'})
+
+    created = 0
+    print(f"{'rows':>9} {'peak (KiB)':>11} {'first byte (ms)':>16} {'total (s)':>10} {'size (MiB)':>11}")
+    for rows in [count for count in ROW_COUNTS if count <= max_rows]:
+        with app.app_context():
+            add_history(student_id, faculty_id, created, rows)
+        created = rows
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.get('/student/download-report')
+        chunks = iter(response.response)
+        size = len(next(chunks))
+        first_byte = (time.perf_counter() - start) * 1000
+        for chunk in chunks:
+            size += len(chunk)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        response.close()
+
+        print(f"{rows:>9} {peak / 1024:>11.0f} {first_byte:>16.1f} {elapsed:>10.2f} {size / 2 ** 20:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
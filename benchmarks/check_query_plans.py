@@ -0,0 +1,199 @@
+"""Fail if any query issued by the app's routes falls back to a full table scan.
+
+Seeds an SQLite database, drives every page and the attendance-taking
+endpoints as each kind of user, and runs EXPLAIN QUERY PLAN on each
+statement they issued. A plan step that scans a table without an index
+is reported, unless the route is listed in EXPECTED_SCANS for that table
+because it genuinely reads the whole table. The script exits non-zero on
+any unexpected scan, so it can guard new queries and index changes.
+
+Run from the repository root:
+
+    python benchmarks/check_query_plans.py [-v]
+"""
+import glob
+import io
+import os
+import re
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+import cv2
+import numpy as np
+from sqlalchemy import event, insert
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'plans.db')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import app
+from attendance_utils import rebuild_summaries
+from directory_utils import encode_cursor
+from models import db, User, Student, Faculty, Admin, AttendanceSession, Attendance
+
+COHORTS = [(branch, year) for branch in ('CSE', 'ECE', 'MECH') for year in ('1st', '2nd', '3rd', '4th')]
+STUDENTS_PER_COHORT = 30
+SESSIONS_PER_FACULTY = 40
+FACULTY_COUNT = 3
+
+# Routes that read every row of a table by design, e.g. site-wide counts
+EXPECTED_SCANS = {
+    'GET /admin/dashboard': {'users', 'students', 'faculty', 'attendance_sessions'},
+    'GET /admin/analytics/data': {'attendance_rollups'},
+}
+
+SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def seed():
+    """A few cohorts of students, their faculty and a history of sessions"""
+    now = datetime.now(timezone.utc)
+    db.create_all()
+    users = [{'email': 'admin@plans', 'user_type': 'admin'}]
+    users += [{'email': f'faculty{i}@plans', 'user_type': 'faculty'} for i in range(FACULTY_COUNT)]
+    users += [{'email': f'student{i}@plans', 'user_type': 'student'}
+              for i in range(len(COHORTS) * STUDENTS_PER_COHORT)]
+    account = User()
+    account.set_password('plans')
+    db.session.execute(insert(User), [dict(user, password_hash=account.password_hash, created_at=now)
+                                      for user in users])
+    user_ids = {email: user_id for user_id, email in db.session.query(User.id, User.email)}
+
+    db.session.add(Admin(user_id=user_ids['admin@plans'], name='Admin'))
+    db.session.add_all(Faculty(user_id=user_ids[f'faculty{i}@plans'], name=f'Faculty {i}', department='CSE',
+                               employee_id=f'E{i}') for i in range(FACULTY_COUNT))
+    db.session.add_all(Student(user_id=user_ids[f'student{i}@plans'], name=f'Student {i}', roll_number=f'R{i}',
+                               branch=COHORTS[i % len(COHORTS)][0], year=COHORTS[i % len(COHORTS)][1],
+                               face_registered=True)
+                       for i in range(len(COHORTS) * STUDENTS_PER_COHORT))
+    db.session.flush()
+
+    cohorts = defaultdict(list)
+    for student_id, branch, year in db.session.query(Student.id, Student.branch, Student.year):
+        cohorts[(branch, year)].append(student_id)
+    for faculty_id, in db.session.query(Faculty.id):
+        for i in range(SESSIONS_PER_FACULTY):
+            branch, year = COHORTS[(faculty_id + i) % len(COHORTS)]
+            session = AttendanceSession(faculty_id=faculty_id, class_name=f'C{i}', branch=branch, year=year,
+                                        session_date=date.today() - timedelta(days=i), start_time=now,
+                                        is_completed=True)
+            db.session.add(session)
+            db.session.flush()
+            db.session.execute(insert(Attendance), [{
+                'student_id': student_id, 'session_id': session.id,
+                'status': 'Present' if (student_id + i) % 4 else 'Absent', 'marked_at': now
+            } for student_id in cohorts[(branch, year)]])
+    db.session.commit()
+    rebuild_summaries()
+    return cohorts[COHORTS[0]][0]
+
+
+def camera_frame():
+    """A JPEG frame with one of the repository's sample faces in it"""
+    frame = np.full((480, 640), 128, np.uint8)
+    samples = sorted(glob.glob(os.path.join(ROOT, 'face_data', '*.jpg')))
+    if samples:
+        face = cv2.resize(cv2.imread(samples[0], cv2.IMREAD_GRAYSCALE), (160, 160))
+        frame[100:260, 240:400] = face
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+def scans(connection, statement, parameters):
+    """Tables a statement reads without an index, from EXPLAIN QUERY PLAN"""
+    tables = set(db.metadata.tables)
+    plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    found = set()
+    for row in plan:
+        match = SCAN.match(row[-1])
+        if match and match.group(1) in tables:
+            found.add(match.group(1))
+    return found
+
+
+def main():
+    verbose = '-v' in sys.argv
+    with app.app_context():
+        student_id = seed()
+        first_student = db.session.get(Student, student_id)
+        student_email = first_student.user.email
+        branch, year = first_student.branch, first_student.year
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, parameters, context, executemany:
+                     executemany or statements.append((statement, parameters)))
+
+    issued = []  # (route, statements) per call; a route may be called several ways
+
+    def call(client, method, path, route=None, **kwargs):
+        statements.clear()
+        response = client.open(path, method=method, **kwargs)
+        assert response.status_code < 400, (method, path, response.status_code)
+        response.close()
+        issued.append((f"{method} {route or path.partition('?')[0]}", list(statements)))
+        return response
+
+    anonymous = app.test_client()
+    for path in ('/', '/login', '/register/student'):
+        call(anonymous, 'GET', path)
+    call(anonymous, 'POST', '/register/student', data={
+        'email': 'new@plans', 'password': 'plans', 'name': 'New', 'roll_number': 'RN',
+        'branch': branch, 'year': year})
+
+    student = app.test_client()
+    call(student, 'POST', '/login', data={'email': student_email, 'password': 'plans', 'user_type': 'student'})
+    for path in ('/student/dashboard', '/student/face-registration', '/student/analytics',
+                 '/student/download-report', '/student/download-pdf-report'):
+        call(student, 'GET', path)
+
+    faculty = app.test_client()
+    call(faculty, 'POST', '/login', data={'email': 'faculty0@plans', 'password': 'plans', 'user_type': 'faculty'})
+    for path in ('/faculty/dashboard', '/faculty/analytics', '/faculty/download-report',
+                 '/faculty/download-pdf-report', '/faculty/take-attendance'):
+        call(faculty, 'GET', path)
+    call(faculty, 'POST', '/faculty/take-attendance', data={'class_name': 'Plans', 'branch': branch, 'year': year})
+    with app.app_context():
+        session_id = db.session.query(db.func.max(AttendanceSession.id)).scalar()
+    call(faculty, 'POST', '/faculty/take-attendance', json={'face_id': student_id, 'session_id': session_id})
+    frame = camera_frame()
+    call(faculty, 'POST', f'/faculty/take-attendance/frame?session_id={session_id}&camera_id=front',
+         data=frame, content_type='image/jpeg')
+    call(faculty, 'POST', f'/faculty/take-attendance/batch?session_id={session_id}',
+         data={'frames': [(io.BytesIO(frame), 'a.jpg'), (io.BytesIO(frame), 'b.jpg')], 'camera_ids': ['a', 'b']},
+         content_type='multipart/form-data')
+    call(faculty, 'POST', f'/faculty/complete-attendance/{session_id}',
+         route='/faculty/complete-attendance/<session_id>')
+
+    admin = app.test_client()
+    call(admin, 'POST', '/login', data={'email': 'admin@plans', 'password': 'plans', 'user_type': 'admin'})
+    for path in ('/admin/dashboard', '/admin/users', '/admin/analytics', '/admin/analytics/data',
+                 '/admin/analytics/data?since=' + datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+                 '/admin/users?q=stu&branch=CSE&face_registered=yes', '/admin/users/data?type=faculty&faculty_q=fac',
+                 '/admin/users/data?type=students&search_in=roll_number&q=r1',
+                 '/admin/users/data?type=students&year=1st&after=' + encode_cursor('student 1', 1),
+                 '/face-model/status'):
+        call(admin, 'GET', path)
+
+    failures = 0
+    with app.app_context(), db.engine.connect() as connection:
+        for route, route_statements in issued:
+            allowed = EXPECTED_SCANS.get(route, set())
+            for statement, parameters in route_statements:
+                if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT INTO', 'WITH')):
+                    continue
+                unexpected = scans(connection, statement, parameters) - allowed
+                if unexpected:
+                    failures += 1
+                    print(f"❌ {route}: full scan of {', '.join(sorted(unexpected))}\n    {' '.join(statement.split())}")
+            if verbose:
+                print(f"{route}: {len(route_statements)} statements")
+
+    if failures:
+        sys.exit(f"{failures} statements scan tables without an index")
+    print(f"✅ No unexpected table scans across {len(issued)} requests")
+
+
+if __name__ == '__main__':
+    main()
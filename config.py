@@ -1,12 +1,98 @@
 import os
 from datetime import timedelta
 
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def database_engine_options(uri, busy_timeout, pool_size, max_overflow, pool_timeout, pool_recycle,
+                            statement_timeout):
+    """SQLALCHEMY_ENGINE_OPTIONS suited to the database behind uri
+    
+    SQLite only needs its busy timeout (the rest is set per connection by
+    configure_database); server databases get a sized, pre-pinged pool and a
+    per-statement time limit in seconds, 0 meaning none.
+    """
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        # sqlite3's timeout is SQLite's busy_timeout: how long to wait for a lock
+        return {'connect_args': {'timeout': busy_timeout}}
+    
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': True
+    }
+    if statement_timeout:
+        if url.get_backend_name() == 'postgresql':
+            options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout * 1000}'}
+        elif url.get_backend_name() in ('mysql', 'mariadb'):
+            options['connect_args'] = {'init_command': f'SET SESSION max_execution_time={statement_timeout * 1000}'}
+    return options
+
+
+def configure_database(engine, config):
+    """Per-connection settings that engine options cannot express"""
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers carry on while a session is being written to
+        cursor.execute(f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}")
+        # NORMAL only syncs at checkpoints, which is still safe in WAL mode
+        cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+        cursor.close()
+
+
+# Published with the code, so only fit for development
+DEFAULT_SECRET_KEY = 'ai-attendance-secret-key-2024'
+
+
 class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'ai-attendance-secret-key-2024'
+    SECRET_KEY = os.environ.get('SECRET_KEY') or DEFAULT_SECRET_KEY
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///attendance.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Database profile: SQLite tuning, or pool settings for a server database
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_BUSY_TIMEOUT = 30  # seconds a writer waits for the lock
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = 30
+    DB_POOL_RECYCLE = 1800
+    DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 30))  # seconds, 0 for none
+    SQLALCHEMY_ENGINE_OPTIONS = database_engine_options(
+        SQLALCHEMY_DATABASE_URI, SQLITE_BUSY_TIMEOUT, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+        DB_POOL_RECYCLE, DB_STATEMENT_TIMEOUT
+    )
     UPLOAD_FOLDER = 'static/uploads'
     FACE_DATA_FOLDER = 'face_data'
+    FACE_MODEL_FOLDER = 'face_models'
+    FACE_MODEL_REBUILD_INTERVAL = 50
+    FACE_MODEL_KEEP_VERSIONS = 3
+    FACE_COHORT_SHARDS = True
+    FACE_PREDICT_WORKERS = min(8, os.cpu_count() or 1)
+    FACE_MATCHER = 'opencv'  # or 'numpy' for the vectorized HistogramMatcher
+    FACE_DETECTION_WIDTH = 960
+    FRAME_MAX_WIDTH = FACE_DETECTION_WIDTH  # wider uploads only cost bandwidth
+    FACE_DETECTION_MASKS = {}  # camera id -> mask image path
+    FRAME_CHANGE_THRESHOLD = 4.0  # mean abs difference of 32x24 thumbnails
+    FRAME_MAX_SKIPS = 10
+    FACE_TRACK_RESOLVE_CONFIDENCE = 50
+    FACE_TRACK_RECHECK_FRAMES = 30  # re-predict resolved faces this often
+    # Socket path (or host:port) of recognition_service.py; unset recognizes in-process
+    RECOGNITION_SERVICE_ADDRESS = os.environ.get('RECOGNITION_SERVICE_ADDRESS')
+    # Shared by the service and the web processes; the service refuses to start without it
+    RECOGNITION_SERVICE_KEY = os.environ.get('RECOGNITION_SERVICE_KEY')
+    RECOGNITION_SERVICE_WORKERS = os.cpu_count() or 1
+    RECOGNITION_SERVICE_TIMEOUT = 10  # seconds a frame waits for the service's workers
+    ADMIN_USERS_PAGE_SIZE = 50
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     
-    PERMANENT_SESSION_LIFETIME = timedelta(minutes=30)
\ No newline at end of file
+    PERMANENT_SESSION_LIFETIME = timedelta(minutes=30)
+    # Seconds a logged-in user and profile are reused across requests; 0 disables
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 0))
\ No newline at end of file
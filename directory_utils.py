@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+
+from sqlalchemy import func, select, tuple_
+
+from models import db, User, Student, Faculty, AttendanceSession
+
+# Columns the student directory can be searched and ordered by
+STUDENT_SEARCH_COLUMNS = {
+    'name': Student.name,
+    'roll_number': Student.roll_number
+}
+
+
+def encode_cursor(key, row_id):
+    """Opaque cursor for the row a page ended on"""
+    return base64.urlsafe_b64encode(json.dumps([key, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """The (key, id) pair of encode_cursor; ValueError if it was tampered with"""
+    try:
+        key, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError('invalid cursor')
+    if not isinstance(key, str) or not isinstance(row_id, int):
+        raise ValueError('invalid cursor')
+    return key, row_id
+
+
+def prefix_range(key, prefix):
+    """key starts with prefix, as a range an index on key can serve"""
+    prefix = prefix.lower()
+    return key >= prefix, key < prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def keyset_page(query, key, id_column, after, page_size):
+    """One page of query ordered by (key, id), resuming after a cursor
+
+    Only the rows of the page are read however deep it is, unlike OFFSET.
+    Returns the rows and the cursor of the next page, or None on the last.
+    """
+    if after:
+        query = query.where(tuple_(key, id_column) > tuple_(*decode_cursor(after)))
+    rows = db.session.execute(query.order_by(key, id_column).limit(page_size + 1)).all()
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1].sort_key, rows[-1].id)
+
+
+def student_directory(page_size, search=None, search_in='name', branch=None, year=None,
+                      face_registered=None, after=None):
+    """A page of students, ordered by name or roll number ignoring case
+
+    search is a case-insensitive prefix of the search_in column, which is
+    also the sort order, so both are served by the same index.
+    """
+    key = func.lower(STUDENT_SEARCH_COLUMNS[search_in])
+    query = select(
+        Student.id, Student.roll_number, Student.name, Student.branch, Student.year,
+        Student.face_registered, key.label('sort_key')
+    )
+    if search:
+        query = query.where(*prefix_range(key, search))
+    if branch:
+        query = query.where(Student.branch == branch)
+    if year:
+        query = query.where(Student.year == year)
+    if face_registered is not None:
+        query = query.where(Student.face_registered == face_registered)
+
+    rows, next_cursor = keyset_page(query, key, Student.id, after, page_size)
+    return {
+        'items': [{
+            'id': row.id,
+            'roll_number': row.roll_number,
+            'name': row.name,
+            'branch': row.branch,
+            'year': row.year,
+            'face_registered': bool(row.face_registered)
+        } for row in rows],
+        'next': next_cursor
+    }
+
+
+def faculty_directory(page_size, search=None, after=None):
+    """A page of faculty ordered by name, with email and session count"""
+    key = func.lower(Faculty.name)
+    session_count = select(func.count(AttendanceSession.id)).where(
+        AttendanceSession.faculty_id == Faculty.id
+    ).scalar_subquery()
+    query = select(
+        Faculty.id, Faculty.employee_id, Faculty.name, Faculty.department, User.email,
+        session_count.label('sessions'), key.label('sort_key')
+    ).join(User, Faculty.user_id == User.id)
+    if search:
+        query = query.where(*prefix_range(key, search))
+
+    rows, next_cursor = keyset_page(query, key, Faculty.id, after, page_size)
+    return {
+        'items': [{
+            'id': row.id,
+            'employee_id': row.employee_id,
+            'name': row.name,
+            'department': row.department,
+            'email': row.email,
+            'sessions': row.sessions
+        } for row in rows],
+        'next': next_cursor
+    }
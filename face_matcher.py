@@ -0,0 +1,206 @@
+import numpy as np
+
+
+class HistogramMatcher:
+    """Vectorized nearest-neighbour search over a trained LBPH model.
+
+    The recognizer's histograms are pulled into one contiguous matrix of
+    their square roots. Since ab / (a + b) <= sqrt(ab) / 2, the chi-square
+    distance LBPH uses (HISTCMP_CHISQR_ALT) is bounded below by
+
+        2 * (sum(a) + sum(b) - 4 * sum(ab / (a + b)))
+            >= 2 * (sum(a) + sum(b) - 2 * sqrt(a) . sqrt(b))
+
+    which is one matrix product for a whole frame of faces. Exact distances
+    are then only computed, nearest bound first, for rows whose bound could
+    still beat the best match found so far.
+    """
+
+    CANDIDATE_CHUNK = 64
+
+    def __init__(self, sqrt_histograms, labels, radius=1, neighbors=8, grid_x=8, grid_y=8,
+                 threshold=float('inf'), row_sums=None, recognizer=None):
+        self.recognizer = recognizer
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.threshold = threshold
+        self.sqrt_histograms = sqrt_histograms
+        self.labels = labels
+        if row_sums is None:
+            row_sums = np.square(sqrt_histograms).sum(axis=1, dtype=np.float64)
+        self.row_sums = row_sums
+
+        self.sample_offsets = []
+        for n in range(self.neighbors):
+            x = np.float32(self.radius * np.cos(2.0 * np.pi * n / float(self.neighbors)))
+            y = np.float32(-self.radius * np.sin(2.0 * np.pi * n / float(self.neighbors)))
+            fx, fy = int(np.floor(x)), int(np.floor(y))
+            cx, cy = int(np.ceil(x)), int(np.ceil(y))
+            ty, tx = np.float32(y - fy), np.float32(x - fx)
+            weights = (
+                np.float32((1 - tx) * (1 - ty)),
+                np.float32(tx * (1 - ty)),
+                np.float32((1 - tx) * ty),
+                np.float32(tx * ty)
+            )
+            self.sample_offsets.append(((fy, fx), (fy, cx), (cy, fx), (cy, cx), weights))
+
+    @classmethod
+    def from_recognizer(cls, recognizer):
+        """Build a matcher from a trained LBPHFaceRecognizer"""
+        histograms = recognizer.getHistograms()
+        neighbors = recognizer.getNeighbors()
+        if histograms:
+            sqrt_histograms = np.sqrt(np.vstack(histograms).astype(np.float32))
+        else:
+            sqrt_histograms = np.empty((0, recognizer.getGridX() * recognizer.getGridY() * 2 ** neighbors), dtype=np.float32)
+        return cls(
+            sqrt_histograms,
+            np.asarray(recognizer.getLabels()).ravel().astype(np.int64),
+            radius=recognizer.getRadius(),
+            neighbors=neighbors,
+            grid_x=recognizer.getGridX(),
+            grid_y=recognizer.getGridY(),
+            threshold=recognizer.getThreshold(),
+            recognizer=recognizer
+        )
+
+    def params(self):
+        """Constructor arguments besides the gallery arrays"""
+        return {
+            'radius': self.radius,
+            'neighbors': self.neighbors,
+            'grid_x': self.grid_x,
+            'grid_y': self.grid_y,
+            'threshold': self.threshold
+        }
+
+    def __len__(self):
+        return len(self.labels)
+
+    def histogram(self, face):
+        """Compute the LBPH spatial histogram of a face the way OpenCV does"""
+        src = np.asarray(face)
+        r = self.radius
+        rows, cols = src.shape
+        center = src[r:rows - r, r:cols - r].astype(np.float32)
+        codes = np.zeros(center.shape, dtype=np.int32)
+        eps = np.finfo(np.float32).eps
+
+        def shifted(dy, dx):
+            return src[r + dy:rows - r + dy, r + dx:cols - r + dx]
+
+        for n, (p1, p2, p3, p4, (w1, w2, w3, w4)) in enumerate(self.sample_offsets):
+            t = w1 * shifted(*p1) + w2 * shifted(*p2)
+            t = t + w3 * shifted(*p3)
+            t = t + w4 * shifted(*p4)
+            codes |= ((t > center) | (np.abs(t - center) < eps)).astype(np.int32) << n
+
+        patterns = 2 ** self.neighbors
+        height = codes.shape[0] // self.grid_y
+        width = codes.shape[1] // self.grid_x
+        cells = codes[:height * self.grid_y, :width * self.grid_x]
+        cells = cells.reshape(self.grid_y, height, self.grid_x, width).transpose(0, 2, 1, 3)
+        cells = cells.reshape(self.grid_y * self.grid_x, height * width)
+        cells = cells + (np.arange(len(cells), dtype=np.int32) * patterns)[:, None]
+
+        hist = np.bincount(cells.ravel(), minlength=len(cells) * patterns).astype(np.float32)
+        return hist / np.float32(max(1, height * width))
+
+    def exact_distances(self, query, rows):
+        """Chi-square distances from a query histogram to some gallery rows"""
+        nonzero = np.flatnonzero(query)
+        q = query[nonzero]
+        block = np.square(self.sqrt_histograms[rows][:, nonzero])
+        overlap = (block * q / (block + q)).sum(axis=1, dtype=np.float64)
+        return 2 * (self.row_sums[rows] + float(q.sum(dtype=np.float64)) - 4 * overlap)
+
+    def search(self, query, bound_products, k, allowed_rows=None):
+        """Exact per-student best distances for the k nearest students
+
+        Returns ([(label, distance)], best_row, best_distance) where best_row
+        is the single nearest gallery row, ties broken by training order
+        like OpenCV. allowed_rows optionally masks the rows to consider.
+        """
+        query_sum = float(query.sum(dtype=np.float64))
+        bounds = 2 * (self.row_sums + query_sum - 2 * bound_products.astype(np.float64))
+        # Allow for float32 rounding in the matrix product
+        bounds -= 1e-3
+        if allowed_rows is not None:
+            bounds[~allowed_rows] = np.inf
+        order = np.argsort(bounds, kind='stable')
+
+        best_by_label = {}
+        best_row, best_dist = -1, float('inf')
+        for start in range(0, len(order), self.CANDIDATE_CHUNK):
+            if bounds[order[start]] == np.inf:
+                break
+            if len(best_by_label) >= k:
+                cutoff = sorted(best_by_label.values())[k - 1]
+                if bounds[order[start]] > cutoff:
+                    break
+            rows = np.sort(order[start:start + self.CANDIDATE_CHUNK])
+            rows = rows[bounds[rows] < np.inf]
+            for row, dist in zip(rows.tolist(), self.exact_distances(query, rows).tolist()):
+                label = int(self.labels[row])
+                if dist < best_by_label.get(label, float('inf')):
+                    best_by_label[label] = dist
+                if dist < best_dist or (dist == best_dist and row < best_row):
+                    best_row, best_dist = row, dist
+
+        nearest = sorted(best_by_label.items(), key=lambda item: item[1])[:k]
+        return nearest, best_row, best_dist
+
+    def bound_products(self, queries):
+        """sqrt(gallery) . sqrt(query) for every row and query, shape (rows, queries)"""
+        return self.sqrt_histograms @ np.sqrt(np.vstack(queries)).T
+
+    def allowed_rows(self, allowed_labels):
+        """Boolean row mask for a set of student ids, or None for all rows"""
+        if allowed_labels is None:
+            return None
+        return np.isin(self.labels, np.fromiter(allowed_labels, dtype=np.int64))
+
+    def predict(self, face, allowed_labels=None):
+        """Return (label, distance) like LBPHFaceRecognizer.predict"""
+        return self.predict_batch([face], allowed_labels)[0]
+
+    def top_k(self, face, k=5, allowed_labels=None):
+        """Return the k closest students as (label, best distance) pairs"""
+        return self.top_k_batch([face], k, allowed_labels)[0]
+
+    def predict_batch(self, faces, allowed_labels=None):
+        """predict() for every face of a frame with one pass over the gallery
+
+        allowed_labels optionally restricts the search to some students.
+        """
+        if len(faces) == 0:
+            return []
+        if len(self.labels) == 0:
+            return [(-1, float('inf'))] * len(faces)
+
+        queries = [self.histogram(face) for face in faces]
+        products = self.bound_products(queries)
+        allowed_rows = self.allowed_rows(allowed_labels)
+        results = []
+        for i, query in enumerate(queries):
+            _, best_row, best_dist = self.search(query, products[:, i], 1, allowed_rows)
+            if best_row < 0 or best_dist >= self.threshold:
+                results.append((-1, float('inf')))
+            else:
+                results.append((int(self.labels[best_row]), best_dist))
+        return results
+
+    def top_k_batch(self, faces, k=5, allowed_labels=None):
+        """top_k() for every face of a frame with one pass over the gallery"""
+        if len(faces) == 0:
+            return []
+        if len(self.labels) == 0:
+            return [[] for _ in faces]
+
+        queries = [self.histogram(face) for face in faces]
+        products = self.bound_products(queries)
+        allowed_rows = self.allowed_rows(allowed_labels)
+        return [self.search(query, products[:, i], k, allowed_rows)[0] for i, query in enumerate(queries)]
@@ -0,0 +1,155 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within a process
+    fcntl = None
+
+
+class FaceSampleStore:
+    """Append-only store of grayscale face samples packed into one file.
+
+    samples.bin holds the raw pixels of every face back to back and
+    samples.idx holds one fixed-size record per face pointing into it, so
+    training can read every sample as a zero-copy view of a memory map.
+    Writers take an exclusive lock on samples.lock, so several processes
+    can append to the same store.
+    """
+
+    INDEX_DTYPE = np.dtype([
+        ('label', '<i8'),
+        ('offset', '<i8'),
+        ('height', '<i4'),
+        ('width', '<i4')
+    ])
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.data_file = os.path.join(directory, 'samples.bin')
+        self.index_file = os.path.join(directory, 'samples.idx')
+        self.lock_file = os.path.join(directory, 'samples.lock')
+        # JPEGs already packed by migrate_jpegs, one filename per line
+        self.migrated_file = os.path.join(directory, 'samples.migrated')
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        if not os.path.exists(self.index_file):
+            return 0
+        return os.path.getsize(self.index_file) // self.INDEX_DTYPE.itemsize
+
+    @contextmanager
+    def locked(self):
+        """Hold the store's write lock, across threads and processes"""
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.lock_file, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, label, face):
+        """Append one grayscale face sample for a student
+
+        Returns the number of samples in the store once it is written.
+        """
+        face = np.ascontiguousarray(face, dtype=np.uint8)
+        if face.ndim != 2:
+            raise ValueError("Face samples must be single-channel images")
+
+        with self.locked():
+            return self.write_sample(label, face)
+
+    def write_sample(self, label, face):
+        # Pixels go in before the index record that points at them, so a
+        # reader never sees a record for data that is not written yet
+        with open(self.data_file, 'ab') as data:
+            offset = data.tell()
+            data.write(face.tobytes())
+
+        record = np.array([(label, offset, face.shape[0], face.shape[1])], dtype=self.INDEX_DTYPE)
+        with open(self.index_file, 'ab') as index:
+            index.write(record.tobytes())
+            return index.tell() // self.INDEX_DTYPE.itemsize
+
+    def read_index(self):
+        count = len(self)
+        if count == 0:
+            return np.empty(0, dtype=self.INDEX_DTYPE)
+        return np.memmap(self.index_file, dtype=self.INDEX_DTYPE, mode='r', shape=(count,))
+
+    def offsets(self):
+        """Map each student id to the index positions of their samples"""
+        index = self.read_index()
+        offsets = {}
+        for position, label in enumerate(index['label'].tolist()):
+            offsets.setdefault(label, []).append(position)
+        return offsets
+
+    def samples(self, labels=None, start=0, stop=None):
+        """Return face views and their labels, optionally for some students only
+
+        start skips the first samples in the store, e.g. those a model
+        was already trained on; stop ends the range before the samples
+        appended since some earlier point.
+        """
+        index = self.read_index()[start:stop]
+        if labels is not None:
+            index = index[np.isin(index['label'], list(labels))]
+        if len(index) == 0:
+            return [], np.empty(0, dtype=np.int32)
+
+        data = np.memmap(self.data_file, dtype=np.uint8, mode='r')
+        faces = []
+        for offset, height, width in zip(index['offset'].tolist(), index['height'].tolist(), index['width'].tolist()):
+            faces.append(data[offset:offset + height * width].reshape(height, width))
+        return faces, index['label'].astype(np.int32)
+
+    def migrate_jpegs(self, face_dir, remove=False):
+        """Pack legacy face_data/student_<id>_<timestamp>.jpg files into the store
+
+        Packed files are recorded, so running it again only packs new ones.
+        The JPEGs are kept unless remove is set, which also deletes those
+        packed by earlier runs. Returns the number of files packed.
+        """
+        if not os.path.exists(face_dir):
+            return 0
+
+        with self.locked():
+            done = set()
+            if os.path.exists(self.migrated_file):
+                with open(self.migrated_file) as record:
+                    done = set(record.read().split())
+
+            migrated = 0
+            with open(self.migrated_file, 'a') as record:
+                for filename in sorted(os.listdir(face_dir)):
+                    if not (filename.startswith('student_') and filename.endswith('.jpg')):
+                        continue
+
+                    parts = filename.split('_')
+                    if len(parts) < 2 or not parts[1].isdigit():
+                        continue
+
+                    img_path = os.path.join(face_dir, filename)
+                    if filename not in done:
+                        face_img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+                        if face_img is None:
+                            continue
+                        self.write_sample(int(parts[1]), face_img)
+                        record.write(filename + '\n')
+                        record.flush()
+                        migrated += 1
+
+                    if remove:
+                        os.remove(img_path)
+
+        return migrated
@@ -3,9 +3,163 @@ import numpy as np
 import os
 import pickle
 import base64
-from PIL import Image
-import io
-from datetime import datetime
+import binascii
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from face_matcher import HistogramMatcher
+from recognition_service import RecognitionClient
+from face_store import FaceSampleStore
+
+def decode_image(image_data):
+    """Decode JPEG/PNG bytes or a base64 data URL straight to grayscale
+    
+    Returns None for empty, malformed or undecodable input.
+    """
+    try:
+        if isinstance(image_data, str):
+            if ',' in image_data:
+                image_data = image_data.split(',')[1]
+            image_data = base64.b64decode(image_data)
+        if not image_data:
+            return None
+        return cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    except (binascii.Error, TypeError, ValueError, cv2.error):
+        return None
+
+class FrameChangeDetector:
+    """Tell whether a camera frame differs enough from the last recognized one"""
+    
+    def __init__(self, threshold, max_skips):
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.reference = None
+        self.result = None
+        self.skips = 0
+        self.last_seen = time.monotonic()
+    
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, (32, 24), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+    
+    def unchanged(self, thumbnail):
+        """Check a frame thumbnail against the last recognized frame"""
+        self.last_seen = time.monotonic()
+        if self.reference is None or self.skips >= self.max_skips:
+            return False
+        return np.abs(thumbnail - self.reference).mean() < self.threshold
+
+class FaceTracker:
+    """Follow face boxes across frames so resolved faces skip prediction
+    
+    A resolved face is predicted again every recheck_frames frames, and as
+    soon as its box moved or resized a lot or it comes back after going
+    undetected for recheck_missed frames, in case someone else now sits
+    where the tracked student was. A match is only trusted when the box
+    overlaps its track and no other: a face that was followed by distance
+    alone, or that overlaps another face, is predicted again every frame.
+    """
+    
+    def __init__(self, resolve_confidence, iou_threshold=0.3, max_missed=5, max_shift=1.0, recheck_frames=30,
+                 recheck_missed=2):
+        self.resolve_confidence = resolve_confidence
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.max_shift = max_shift
+        self.recheck_frames = recheck_frames
+        self.recheck_missed = recheck_missed
+        self.tracks = []
+    
+    @staticmethod
+    def overlap(box, other):
+        """Intersection over union of two boxes"""
+        x, y, w, h = box
+        ox, oy, ow, oh = other
+        inter_w = max(0, min(x + w, ox + ow) - max(x, ox))
+        inter_h = max(0, min(y + h, oy + oh) - max(y, oy))
+        inter = inter_w * inter_h
+        return inter / float(w * h + ow * oh - inter)
+    
+    def match_score(self, box, other):
+        """How well box continues a track last seen at other, 0 if it cannot
+        
+        Boxes overlapping by iou_threshold score their IoU. A similar-sized
+        face that moved further, up to max_shift box widths, still matches
+        with a score below iou_threshold, so overlapping pairs win first.
+        """
+        iou = self.overlap(box, other)
+        if iou >= self.iou_threshold:
+            return iou
+        
+        x, y, w, h = box
+        ox, oy, ow, oh = other
+        if max(w, ow) > 1.5 * min(w, ow):
+            return 0.0
+        distance = np.hypot((x + w / 2) - (ox + ow / 2), (y + h / 2) - (oy + oh / 2))
+        return max(0.0, 1 - distance / (self.max_shift * max(w, ow))) * self.iou_threshold
+    
+    def assign(self, boxes):
+        """Return the track for each box, starting new tracks as needed"""
+        pairs = []
+        # Faces touching more than one box or track may belong to someone else
+        box_overlaps = [sum(self.overlap(box, other) > 0 for other in boxes) - 1 for box in boxes]
+        track_overlaps = [0] * len(self.tracks)
+        for box_index, box in enumerate(boxes):
+            for track_index, track in enumerate(self.tracks):
+                score = self.match_score(box, track['box'])
+                if score > 0:
+                    pairs.append((score, box_index, track_index))
+                if self.overlap(box, track['box']) > 0:
+                    box_overlaps[box_index] += 1
+                    track_overlaps[track_index] += 1
+        
+        # Greedy matching, best overlaps first
+        assigned = [None] * len(boxes)
+        confirmed = [False] * len(boxes)
+        used_tracks = set()
+        for score, box_index, track_index in sorted(pairs, reverse=True):
+            if assigned[box_index] is None and track_index not in used_tracks:
+                assigned[box_index] = self.tracks[track_index]
+                used_tracks.add(track_index)
+                # Overlapping faces can trade tracks between frames
+                confirmed[box_index] = (score >= self.iou_threshold and box_overlaps[box_index] == 1 and
+                                        track_overlaps[track_index] == 1)
+        
+        for track_index, track in enumerate(self.tracks):
+            if track_index not in used_tracks:
+                track['missed'] += 1
+        self.tracks = [track for track in self.tracks if track['missed'] <= self.max_missed]
+        
+        for box_index, box in enumerate(boxes):
+            track = assigned[box_index]
+            if track is None:
+                track = {'face_id': None, 'confidence': 0, 'resolved': False}
+                self.tracks.append(track)
+                assigned[box_index] = track
+            track['box'] = tuple(int(v) for v in box)
+            if track['resolved']:
+                track['frames_resolved'] += 1
+                if (not confirmed[box_index] or track['frames_resolved'] >= self.recheck_frames or
+                        track['missed'] >= self.recheck_missed or
+                        self.overlap(track['box'], track['resolved_box']) < self.iou_threshold):
+                    track['resolved'] = False
+            track['missed'] = 0
+        
+        return assigned
+    
+    def resolve(self, track, face_id, confidence):
+        """Record a prediction for a track"""
+        track['face_id'] = face_id
+        track['confidence'] = confidence
+        track['resolved'] = face_id is not None and confidence >= self.resolve_confidence
+        track['resolved_box'] = track['box']
+        track['frames_resolved'] = 0
 
 class FaceRecognitionSystem:
     def __init__(self):
@@ -15,16 +169,123 @@ class FaceRecognitionSystem:
         self.known_face_names = {}
         self.model_trained = False
         self.model_file = 'face_model.yml'
+        self.model_dir = 'face_models'
+        self.model_version = 0
+        self.keep_versions = 3
+        self.face_dir = 'face_data'
+        self.sample_store = FaceSampleStore(self.face_dir)
+        # Registrations are folded into the model with update(); once
+        # rebuild_interval samples were added it is retrained from the
+        # sample store, and only rebuilt models are saved to model_dir
+        self.rebuild_interval = 50
+        self.rebuilt_samples = 0
+        self.save_pending = False
+        self.model_saver = None
+        # Two recognizers take turns: the worker thread updates the one not
+        # serving, then swaps it in. Each covers the first *_samples samples
+        # of the store (None if unknown), and the worker waits until no
+        # frame holds a recognizer before updating it
+        self.serving_samples = None
+        self.training_recognizer = None
+        self.training_samples = 0
+        self.training_lock = threading.Lock()
+        self.recognizer_users = {}
+        self.recognizer_released = threading.Condition()
+        self.training_jobs = queue.Queue()
+        # Written by request threads and the training thread
+        self.training_job_status = OrderedDict()
+        self.job_status_lock = threading.Lock()
+        self.training_worker = None
+        # Sessions only search the shard of their (branch, year) cohort.
+        # Shards are built and updated on the training thread, with a spare
+        # recognizer each that is swapped in like the global one
+        self.cohort_shards = True
+        self.cohort_models = {}
+        self.cohort_requests = set()
+        # OpenCV releases the GIL in predict, so the faces of one frame can
+        # be matched on a thread pool; 1 keeps prediction serial
+        self.predict_workers = 1
+        self.predict_pool = None
+        # 'opencv' uses LBPHFaceRecognizer.predict, 'numpy' the vectorized
+        # HistogramMatcher built from the same histograms
+        self.matcher = 'opencv'
+        self.matchers = {}
+        # With a recognition service address set, ROIs are matched by
+        # recognition_service.py, which also does all training; this
+        # process never loads the model and only appends samples
+        self.recognition_client = None
+        self.cohort_members = {}
+        self.cohort_members_samples = 0
+        # Detection runs on a copy scaled down to this width (0 disables);
+        # boxes are mapped back so ROIs are still cut at full resolution
+        self.detection_width = 960
+        self.min_face_size = 30
+        self.detection_masks = {}
+        # (camera id, frame shape) -> the camera's mask resized to that shape
+        self.resized_masks = {}
+        # Per-session change detectors let near-identical frames reuse the
+        # previous recognition result
+        self.frame_change_threshold = 4.0
+        self.frame_max_skips = 10
+        self.frame_gate_idle_timeout = 3600
+        self.frame_gates = {}
+        self.frames_received = 0
+        self.frames_skipped = 0
+        # Tracks whose prediction reached this confidence are not re-predicted
+        # until recheck_frames later or until their box moves
+        self.track_resolve_confidence = 50
+        self.track_recheck_frames = 30
+        self.face_trackers = {}
+        self.faces_predicted = 0
         # Don't load model during initialization - will be loaded when needed
     
     def load_model(self, app):
         """Load trained face recognition model with app context"""
         with app.app_context():
+            self.face_dir = app.config.get('FACE_DATA_FOLDER', self.face_dir)
+            self.sample_store = FaceSampleStore(self.face_dir)
+            self.rebuild_interval = app.config.get('FACE_MODEL_REBUILD_INTERVAL', self.rebuild_interval)
+            self.model_dir = app.config.get('FACE_MODEL_FOLDER', self.model_dir)
+            self.keep_versions = app.config.get('FACE_MODEL_KEEP_VERSIONS', self.keep_versions)
+            self.predict_workers = app.config.get('FACE_PREDICT_WORKERS', self.predict_workers)
+            self.matcher = app.config.get('FACE_MATCHER', self.matcher)
+            self.cohort_shards = app.config.get('FACE_COHORT_SHARDS', self.cohort_shards)
+            self.detection_width = app.config.get('FACE_DETECTION_WIDTH', self.detection_width)
+            self.frame_change_threshold = app.config.get('FRAME_CHANGE_THRESHOLD', self.frame_change_threshold)
+            self.frame_max_skips = app.config.get('FRAME_MAX_SKIPS', self.frame_max_skips)
+            self.track_resolve_confidence = app.config.get('FACE_TRACK_RESOLVE_CONFIDENCE', self.track_resolve_confidence)
+            self.track_recheck_frames = app.config.get('FACE_TRACK_RECHECK_FRAMES', self.track_recheck_frames)
+            for camera_id, mask_file in app.config.get('FACE_DETECTION_MASKS', {}).items():
+                self.set_detection_mask(camera_id, cv2.imread(mask_file, cv2.IMREAD_GRAYSCALE))
+            service_address = app.config.get('RECOGNITION_SERVICE_ADDRESS')
+            if service_address:
+                # Wait a little longer than the service waits for its workers
+                timeout = app.config.get('RECOGNITION_SERVICE_TIMEOUT', 10) + 5
+                service_key = app.config.get('RECOGNITION_SERVICE_KEY')
+                if not service_key:
+                    raise RuntimeError("RECOGNITION_SERVICE_KEY must be set to use the recognition service")
+                self.recognition_client = RecognitionClient(service_address, service_key.encode(), timeout=timeout)
             try:
-                if os.path.exists(self.model_file):
-                    self.recognizer.read(self.model_file)
+                migrated = self.sample_store.migrate_jpegs(self.face_dir)
+                if migrated:
+                    print(f"✅ Packed {migrated} face images into the sample store")
+                
+                model_path, self.model_version = self.latest_model_file()
+                if self.recognition_client is not None:
+                    # The service trains on the sample store and serves the result
+                    self.model_trained = True
+                    print(f"✅ Recognizing through the service at {service_address}")
+                elif len(self.sample_store) > 0:
+                    # Training from the packed samples beats parsing the saved
+                    # YAML, and tells which samples the model covers
+                    self.train_model(save=self.model_is_stale())
+                elif model_path:
+                    recognizer = cv2.face.LBPHFaceRecognizer_create()
+                    recognizer.read(model_path)
+                    self.prepare_matcher(recognizer)
+                    self.recognizer = recognizer
                     self.model_trained = True
-                    print("✅ Face recognition model loaded successfully")
+                    print(f"✅ Face recognition model v{self.model_version} loaded successfully")
                 
                 # Load face IDs and names from database
                 from models import Student
@@ -43,56 +304,120 @@ class FaceRecognitionSystem:
                 print(f"❌ Error loading model: {e}")
                 self.model_trained = False
     
-    def detect_faces(self, image_np):
+    def latest_model_file(self):
+        """Return the path and version of the newest saved model"""
+        versions = self.saved_versions()
+        if versions:
+            return self.model_path(versions[-1]), versions[-1]
+        
+        # Models saved before versioning live in a single file
+        if os.path.exists(self.model_file):
+            return self.model_file, 0
+        return None, 0
+    
+    def model_path(self, version):
+        return os.path.join(self.model_dir, f'face_model_v{version:06d}.yml')
+    
+    def saved_versions(self):
+        if not os.path.exists(self.model_dir):
+            return []
+        return sorted(int(filename[len('face_model_v'):-len('.yml')]) for filename in os.listdir(self.model_dir)
+                      if filename.startswith('face_model_v') and filename.endswith('.yml'))
+    
+    def model_is_stale(self):
+        """Check for face samples added after the model file was saved"""
+        if len(self.sample_store) == 0:
+            return False
+        
+        model_path, _ = self.latest_model_file()
+        model_mtime = os.path.getmtime(model_path) if model_path else 0
+        return os.path.getmtime(self.sample_store.index_file) > model_mtime
+    
+    def set_detection_mask(self, camera_id, mask):
+        """Restrict detection for a camera to the non-zero area of a mask"""
+        if mask is None:
+            self.detection_masks.pop(camera_id, None)
+        else:
+            self.detection_masks[camera_id] = mask
+        for key in [key for key in self.resized_masks if key[0] == camera_id]:
+            self.resized_masks.pop(key, None)
+    
+    def detect_faces(self, image_np, camera_id=None):
         """Detect faces in image"""
-        gray = cv2.cvtColor(image_np, cv2.COLOR_BGR2GRAY)
+        gray = image_np if image_np.ndim == 2 else cv2.cvtColor(image_np, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        
+        # Only search the bounding box of the camera's region of interest
+        mask = self.detection_masks.get(camera_id)
+        if mask is not None:
+            if mask.shape != gray.shape:
+                # Always resize from the configured mask, never a resized copy
+                resized = self.resized_masks.get((camera_id, gray.shape))
+                if resized is None:
+                    resized = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST)
+                    self.resized_masks[(camera_id, gray.shape)] = resized
+                mask = resized
+            x0, y0, crop_w, crop_h = cv2.boundingRect(mask)
+            if crop_w == 0 or crop_h == 0:
+                return np.empty((0, 4), dtype=np.int32), gray
+        else:
+            x0, y0, crop_w, crop_h = 0, 0, width, height
+        search = gray[y0:y0+crop_h, x0:x0+crop_w]
+        
+        scale = 1.0
+        if self.detection_width and crop_w > self.detection_width:
+            scale = self.detection_width / crop_w
+            search = cv2.resize(search, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        min_size = max(1, int(round(self.min_face_size * scale)))
+        
         faces = self.face_detector.detectMultiScale(
-            gray,
+            search,
             scaleFactor=1.1,
             minNeighbors=5,
-            minSize=(30, 30),
+            minSize=(min_size, min_size),
             flags=cv2.CASCADE_SCALE_IMAGE
         )
+        if len(faces) == 0:
+            return np.empty((0, 4), dtype=np.int32), gray
+        
+        # Map boxes back to full-resolution coordinates
+        faces = np.round(np.asarray(faces) / scale).astype(np.int32)
+        faces[:, 0] = np.clip(faces[:, 0] + x0, 0, width - 1)
+        faces[:, 1] = np.clip(faces[:, 1] + y0, 0, height - 1)
+        faces[:, 2] = np.minimum(faces[:, 2], width - faces[:, 0])
+        faces[:, 3] = np.minimum(faces[:, 3], height - faces[:, 1])
+        
+        if mask is not None:
+            centers_x = faces[:, 0] + faces[:, 2] // 2
+            centers_y = faces[:, 1] + faces[:, 3] // 2
+            faces = faces[mask[centers_y, centers_x] > 0]
+        
         return faces, gray
     
     def register_face(self, image_data, student_id, student_name, app):
         """Register a new face with app context"""
         with app.app_context():
             try:
-                # Decode base64 image
-                if isinstance(image_data, str) and ',' in image_data:
-                    image_data = image_data.split(',')[1]
-                
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-                
-                # Convert to numpy array
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                image_np = np.array(image)
+                # Decode image
+                image_np = decode_image(image_data)
+                if image_np is None:
+                    return False, "Could not decode the image", None
                 
                 # Detect faces
                 faces, gray = self.detect_faces(image_np)
                 
                 if len(faces) == 0:
-                    return False, "No face detected in the image"
+                    return False, "No face detected in the image", None
                 
                 if len(faces) > 1:
-                    return False, "Multiple faces detected. Please upload image with only one face."
+                    return False, "Multiple faces detected. Please upload image with only one face.", None
                 
                 # Extract face region
                 (x, y, w, h) = faces[0]
                 face_roi = gray[y:y+h, x:x+w]
                 
-                # Save face image for training
-                face_dir = 'face_data'
-                if not os.path.exists(face_dir):
-                    os.makedirs(face_dir)
-                
-                # Save multiple samples for better recognition
-                face_filename = f"{face_dir}/student_{student_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                cv2.imwrite(face_filename, face_roi)
+                # Save face sample for training
+                stored_samples = self.sample_store.append(student_id, face_roi)
                 
                 # Update database
                 from models import Student, db
@@ -106,46 +431,239 @@ class FaceRecognitionSystem:
                         self.known_face_ids.append(student_id)
                         self.known_face_names[student_id] = student_name
                     
-                    # Retrain model with new face
-                    self.train_model()
+                    if self.recognition_client is not None:
+                        # The service picks the sample up from the store
+                        job_id = self.track_service_training(stored_samples)
+                    else:
+                        # Fold the new face into the model in the background
+                        job_id = self.submit_training([student_id], (student.branch, student.year))
                     
-                    return True, "Face registered successfully!"
+                    return True, "Face registered successfully!", job_id
                 else:
-                    return False, "Student not found"
+                    return False, "Student not found", None
                     
             except Exception as e:
-                return False, f"Error registering face: {str(e)}"
+                return False, f"Error registering face: {str(e)}", None
+    
+    def submit_training(self, labels, cohort=None):
+        """Have the training worker fold in the students' stored samples; returns a job id"""
+        job_id = uuid.uuid4().hex
+        self.set_job_status(job_id, 'queued')
+        self.queue_training(job_id, labels, cohort)
+        return job_id
+    
+    def queue_training(self, job_id, labels, cohort):
+        """Queue work for the training worker, starting it if needed; job_id may be None"""
+        self.training_jobs.put((job_id, labels, cohort))
+        
+        if self.training_worker is None or not self.training_worker.is_alive():
+            self.training_worker = threading.Thread(target=self.training_loop, daemon=True)
+            self.training_worker.start()
+    
+    def track_service_training(self, stored_samples):
+        """A job id that is done once the service's model covers stored_samples samples"""
+        job_id = uuid.uuid4().hex
+        self.set_job_status(job_id, 'queued', samples=stored_samples)
+        return job_id
+    
+    def set_job_status(self, job_id, status, **fields):
+        with self.job_status_lock:
+            self.training_job_status[job_id] = dict(fields, status=status, model_version=self.model_version)
+            while len(self.training_job_status) > 1000:
+                self.training_job_status.popitem(last=False)
+    
+    def training_loop(self):
+        """Apply queued samples in batches and publish one model per batch"""
+        while True:
+            batch = [self.training_jobs.get()]
+            while True:
+                try:
+                    batch.append(self.training_jobs.get_nowait())
+                except queue.Empty:
+                    break
+            
+            jobs = [job_id for job_id, _, _ in batch if job_id is not None]
+            for job_id in jobs:
+                self.set_job_status(job_id, 'running')
+            
+            with self.training_lock:
+                success = self.update_model()
+                # An earlier batch may already have folded these samples in
+                if success and self.training_samples != self.serving_samples:
+                    success = self.publish_model()
+            
+            # Build requested shards and fold new samples into existing ones
+            cohort_labels = {}
+            for _, job_labels, cohort in batch:
+                if cohort is not None:
+                    cohort_labels.setdefault(cohort, set()).update(job_labels)
+            for cohort, new_labels in cohort_labels.items():
+                if cohort in self.cohort_members:
+                    self.cohort_members[cohort] = self.cohort_members[cohort] | new_labels
+                try:
+                    if cohort in self.cohort_models:
+                        self.update_cohort_model(cohort, new_labels)
+                    elif cohort in self.cohort_requests:
+                        self.build_cohort_model(cohort, new_labels)
+                except Exception as e:
+                    print(f"❌ Error training cohort model {cohort}: {e}")
+                self.cohort_requests.discard(cohort)
+            
+            for job_id in jobs:
+                self.set_job_status(job_id, 'done' if success else 'failed')
+    
+    def training_status(self, job_id=None):
+        """Report training queue depth and the active model version"""
+        status = {
+            'queue_depth': self.training_jobs.qsize(),
+            'model_version': self.model_version,
+            'model_trained': self.model_trained,
+            'cohort_models': len(self.cohort_models)
+        }
+        if self.recognition_client is not None:
+            try:
+                service = self.recognition_client.status()
+            except Exception as e:
+                print(f"❌ Could not reach the recognition service: {e}")
+                service = None
+            if service:
+                status['model_version'] = service['model_version']
+                with self.job_status_lock:
+                    for job in self.training_job_status.values():
+                        if job['status'] == 'queued' and (service['trained_samples'] or 0) >= job['samples']:
+                            job.update(status='done', model_version=service['model_version'])
+        if job_id:
+            with self.job_status_lock:
+                status['job'] = dict(self.training_job_status.get(job_id, {'status': 'unknown'}))
+        return status
     
-    def train_model(self):
-        """Train the face recognition model"""
+    @contextmanager
+    def serving_recognizer(self, cohort=None):
+        """The recognizer to predict with, kept from updates until released
+        
+        With a cohort, the recognizer of the cohort's shard.
+        """
+        with self.recognizer_released:
+            recognizer = self.recognizer if cohort is None else self.cohort_models[cohort]['recognizer']
+            self.recognizer_users[id(recognizer)] = self.recognizer_users.get(id(recognizer), 0) + 1
         try:
-            face_dir = 'face_data'
-            if not os.path.exists(face_dir):
-                return False
+            yield recognizer
+        finally:
+            self.release_recognizer(recognizer)
+    
+    def release_recognizer(self, recognizer):
+        with self.recognizer_released:
+            self.recognizer_users[id(recognizer)] -= 1
+            if not self.recognizer_users[id(recognizer)]:
+                del self.recognizer_users[id(recognizer)]
+                self.recognizer_released.notify_all()
+    
+    def update_model(self):
+        """Fold samples appended to the store since the last update into the training model
+        
+        Reading them from the store rather than the job queue also picks up
+        samples other processes registered.
+        """
+        if self.training_recognizer is None:
+            return self.build_model()
+        
+        faces, labels = self.sample_store.samples(start=self.training_samples)
+        if self.training_samples + len(faces) - self.rebuilt_samples >= self.rebuild_interval:
+            # Time for a compacting full rebuild, which is kept on disk
+            self.save_pending = True
+            return self.build_model()
+        if len(faces) == 0:
+            return True
+        
+        try:
+            # Frames that started on this recognizer before it was swapped out
+            with self.recognizer_released:
+                self.recognizer_released.wait_for(lambda: id(self.training_recognizer) not in self.recognizer_users)
+            self.training_recognizer.update(faces, labels)
+            self.training_samples += len(faces)
+            print(f"✅ Model updated with {len(faces)} new face samples")
+            return True
+        except Exception as e:
+            print(f"❌ Error updating model: {e}")
+            return False
+    
+    def publish_model(self):
+        """Swap the training model in for recognition
+        
+        The recognizer it replaces becomes the next training model. Saving
+        an LBPH model takes seconds at a few hundred samples, so only
+        rebuilt models are written to disk, on a background thread.
+        """
+        try:
+            recognizer = self.training_recognizer
+            self.prepare_matcher(recognizer)
+            # Another process may have saved newer versions
+            version = max(self.model_version, self.latest_model_file()[1]) + 1
+            save = self.save_pending
+            with self.recognizer_released:
+                previous, previous_samples = self.recognizer, self.serving_samples
+                self.recognizer, self.serving_samples = recognizer, self.training_samples
+                if save:
+                    self.recognizer_users[id(recognizer)] = self.recognizer_users.get(id(recognizer), 0) + 1
+            self.model_version = version
+            self.model_trained = True
+            
+            if previous_samples is None:
+                # A model loaded from disk or never trained; rebuild next time
+                self.training_recognizer = None
+            else:
+                self.training_recognizer, self.training_samples = previous, previous_samples
             
-            faces = []
-            labels = []
+            if save:
+                self.save_pending = False
+                saver = threading.Thread(target=self.save_model, args=(recognizer, version, self.model_saver),
+                                         daemon=True)
+                self.model_saver = saver
+                saver.start()
             
-            # Load all face images
-            for filename in os.listdir(face_dir):
-                if filename.startswith('student_') and filename.endswith('.jpg'):
-                    # Extract student ID from filename
-                    parts = filename.split('_')
-                    if len(parts) >= 2:
-                        student_id = int(parts[1])
-                        
-                        # Load face image
-                        img_path = os.path.join(face_dir, filename)
-                        face_img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                        
-                        if face_img is not None:
-                            faces.append(face_img)
-                            labels.append(student_id)
+            print(f"✅ Model v{version} published")
+            return True
+        except Exception as e:
+            print(f"❌ Error publishing model: {e}")
+            return False
+    
+    def save_model(self, recognizer, version, previous_saver=None):
+        """Write a published model to model_dir, then release it for training"""
+        try:
+            if previous_saver is not None:
+                previous_saver.join()
+            os.makedirs(self.model_dir, exist_ok=True)
+            model_path = self.model_path(version)
+            tmp_path = f'{model_path}.{os.getpid()}.tmp'
+            recognizer.save(tmp_path)
+            os.replace(tmp_path, model_path)
+            
+            for old_version in self.saved_versions()[:-self.keep_versions]:
+                os.remove(self.model_path(old_version))
+            print(f"✅ Model v{version} saved")
+        except Exception as e:
+            print(f"❌ Error saving model v{version}: {e}")
+        finally:
+            self.release_recognizer(recognizer)
+    
+    def train_model(self, save=True):
+        """Train the face recognition model from scratch and publish it"""
+        with self.training_lock:
+            if not self.build_model():
+                return False
+            self.save_pending = save
+            return self.publish_model()
+    
+    def build_model(self):
+        """Build the training model from every sample in the sample store"""
+        try:
+            faces, labels = self.sample_store.samples()
             
             if len(faces) > 0:
-                self.recognizer.train(faces, np.array(labels))
-                self.recognizer.save(self.model_file)
-                self.model_trained = True
+                recognizer = cv2.face.LBPHFaceRecognizer_create()
+                recognizer.train(faces, labels)
+                self.training_recognizer = recognizer
+                self.training_samples = self.rebuilt_samples = len(labels)
                 print(f"✅ Model trained with {len(faces)} face samples")
                 return True
             else:
@@ -155,26 +673,196 @@ class FaceRecognitionSystem:
             print(f"❌ Error training model: {e}")
             return False
     
-    def recognize_face(self, frame):
-        """Recognize faces in frame"""
+    def open_cohort(self, cohort):
+        """Have the training worker build the cohort's shard unless it has one or one is queued"""
+        if (not self.cohort_shards or self.recognition_client is not None or cohort in self.cohort_models or
+                cohort in self.cohort_requests):
+            return
+        try:
+            student_ids = self.cohort_student_ids(cohort)
+        except Exception as e:
+            print(f"❌ Could not load cohort {cohort}: {e}")
+            return
+        self.cohort_requests.add(cohort)
+        self.queue_training(None, student_ids, cohort)
+    
+    def cohort_labels(self, cohort):
+        """Ids of the cohort's students, cached until the sample store grows
+        
+        Other processes register faces too, so the cohorts are re-read
+        whenever the store has new samples.
+        """
+        stored_samples = len(self.sample_store)
+        if stored_samples != self.cohort_members_samples:
+            self.cohort_members = {}
+            self.cohort_members_samples = stored_samples
+        if cohort not in self.cohort_members:
+            self.cohort_members[cohort] = self.cohort_student_ids(cohort)
+        return self.cohort_members[cohort]
+    
+    def cohort_student_ids(self, cohort):
+        """Ids of the cohort's students; only those with face samples end up in a model
+        
+        face_registered is not checked: a student's row exists before their
+        sample is stored, but the flag is only committed after it.
+        """
+        from models import Student
+        branch, year = cohort
+        return {student_id for (student_id,) in Student.query.with_entities(Student.id).filter_by(
+            branch=branch, year=year
+        )}
+    
+    def build_cohort_model(self, cohort, student_ids):
+        """Train a shard holding only the given students' samples
+        
+        The recognizer it replaces becomes the shard's spare.
+        """
+        stored_samples = len(self.sample_store)
+        faces, labels = self.sample_store.samples(student_ids, stop=stored_samples)
+        recognizer = None
+        if len(faces) > 0:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.train(faces, labels)
+            self.prepare_matcher(recognizer)
+        
+        shard = {'recognizer': recognizer, 'samples': stored_samples, 'student_ids': set(student_ids),
+                 'spare': None, 'spare_samples': 0, 'spare_ids': set()}
+        with self.recognizer_released:
+            previous = self.cohort_models.get(cohort)
+            if previous is not None and previous['recognizer'] is not None:
+                shard.update(spare=previous['recognizer'], spare_samples=previous['samples'],
+                             spare_ids=previous['student_ids'])
+            self.cohort_models[cohort] = shard
+        print(f"✅ Cohort model {cohort} trained with {len(faces)} face samples")
+        return shard
+    
+    def update_cohort_model(self, cohort, new_labels):
+        """Fold the cohort's new samples into its spare recognizer and swap it in
+        
+        The spare is behind the serving recognizer by one update, and may
+        lack students who joined since; their earlier samples are read
+        from the start of the store.
+        """
+        shard = self.cohort_models[cohort]
+        spare = shard['spare']
+        student_ids = shard['student_ids'] | new_labels
+        if spare is None:
+            return self.build_cohort_model(cohort, student_ids)
+        
+        stored_samples = len(self.sample_store)
+        faces, labels = self.sample_store.samples(student_ids, start=shard['spare_samples'], stop=stored_samples)
+        joined = student_ids - shard['spare_ids']
+        if joined:
+            earlier_faces, earlier_labels = self.sample_store.samples(joined, stop=shard['spare_samples'])
+            faces, labels = earlier_faces + faces, np.concatenate([earlier_labels, labels])
+        
+        if len(faces) > 0:
+            # Frames that started on the spare before it was swapped out
+            with self.recognizer_released:
+                self.recognizer_released.wait_for(lambda: id(spare) not in self.recognizer_users)
+            spare.update(faces, labels)
+            self.prepare_matcher(spare)
+        
+        with self.recognizer_released:
+            self.cohort_models[cohort] = {
+                'recognizer': spare, 'samples': stored_samples, 'student_ids': student_ids,
+                'spare': shard['recognizer'], 'spare_samples': shard['samples'], 'spare_ids': shard['student_ids']
+            }
+        print(f"✅ Cohort model {cohort} updated with {len(faces)} face samples")
+        return self.cohort_models[cohort]
+    
+    def prepare_matcher(self, recognizer):
+        """Build the vectorized matcher for a recognizer before it goes live"""
+        if self.matcher != 'numpy':
+            return None
+        
+        live = {id(self.recognizer), id(recognizer)}
+        live.update(id(shard['recognizer']) for shard in self.cohort_models.values())
+        for key in list(self.matchers):
+            if key not in live:
+                self.matchers.pop(key, None)
+        
+        matcher = HistogramMatcher.from_recognizer(recognizer)
+        self.matchers[id(recognizer)] = matcher
+        return matcher
+    
+    def predict_faces(self, recognizer, face_rois, allowed_labels=None):
+        """Predict labels for face ROIs, in parallel when configured"""
+        if self.recognition_client is not None:
+            return self.recognition_client.predict(face_rois, allowed_labels)
+        
+        if self.matcher == 'numpy' and face_rois:
+            matcher = self.matchers.get(id(recognizer))
+            if matcher is None or matcher.recognizer is not recognizer:
+                matcher = self.prepare_matcher(recognizer)
+            # Scores the whole frame in one pass over the gallery
+            return matcher.predict_batch(face_rois, allowed_labels)
+        
+        if self.predict_workers <= 1 or len(face_rois) <= 1:
+            return [recognizer.predict(face_roi) for face_roi in face_rois]
+        
+        if self.predict_pool is None:
+            self.predict_pool = ThreadPoolExecutor(max_workers=self.predict_workers)
+        # map() yields results in submission order
+        return list(self.predict_pool.map(recognizer.predict, face_rois))
+    
+    def recognize_face(self, frame, camera_id=None, tracker=None, cohort=None):
+        """Recognize faces in frame, only among the cohort's students if given"""
         recognized_faces = []
         
         if not self.model_trained:
             return recognized_faces
         
         try:
+            shard_cohort, allowed_labels = None, None
+            if cohort and self.cohort_shards:
+                shard = self.cohort_models.get(cohort) if self.recognition_client is None else None
+                if shard is None:
+                    # The service filters its shared gallery instead of keeping
+                    # shards; here the global model stands in until the training
+                    # worker has built the cohort's shard
+                    self.open_cohort(cohort)
+                    allowed_labels = self.cohort_labels(cohort)
+                elif shard['recognizer'] is None:
+                    return recognized_faces
+                else:
+                    shard_cohort = cohort
+            
             # Detect faces
-            faces, gray = self.detect_faces(frame)
+            faces, gray = self.detect_faces(frame, camera_id)
             
-            for (x, y, w, h) in faces:
-                face_roi = gray[y:y+h, x:x+w]
-                
-                # Recognize face
-                label, confidence = self.recognizer.predict(face_roi)
+            # Faces already resolved by the tracker keep their earlier result
+            tracks = tracker.assign(faces) if tracker else [None] * len(faces)
+            pending = [i for i, track in enumerate(tracks) if track is None or not track['resolved']]
+            face_rois = [gray[y:y+h, x:x+w] for (x, y, w, h) in (faces[i] for i in pending)]
+            
+            # Recognize faces
+            if self.recognition_client is None:
+                # The training worker updates a model once it is swapped out,
+                # so keep it for the whole frame
+                with self.serving_recognizer(shard_cohort) as serving:
+                    predictions = self.predict_faces(serving, face_rois, allowed_labels)
+            else:
+                predictions = self.predict_faces(None, face_rois, allowed_labels)
+            predictions = dict(zip(pending, predictions))
+            self.faces_predicted += len(face_rois)
+            
+            for i, (x, y, w, h) in enumerate(faces):
+                if i not in predictions:
+                    face_id = tracks[i]['face_id']
+                    recognized_faces.append({
+                        'face_id': face_id,
+                        'location': (x, y, w, h),
+                        'confidence': tracks[i]['confidence'],
+                        'name': self.known_face_names.get(face_id, 'Unknown')
+                    })
+                    continue
                 
+                label, confidence = predictions[i]
                 # LBPH returns lower confidence for better matches
-                # Confidence < 50 is generally good, > 80 is poor
-                if confidence < 80:  # Adjust threshold as needed
+                # Confidence < 50 is generally good, > 80 is poor (adjust as needed).
+                # OpenCV's LBPH cannot search only the allowed labels, so others are unknown
+                if confidence < 80 and (allowed_labels is None or label in allowed_labels):
                     face_id = label
                     recognized_faces.append({
                         'face_id': face_id,
@@ -189,12 +877,68 @@ class FaceRecognitionSystem:
                         'confidence': 0,
                         'name': 'Unknown'
                     })
+                
+                if tracks[i] is not None:
+                    tracker.resolve(tracks[i], recognized_faces[-1]['face_id'], recognized_faces[-1]['confidence'])
             
         except Exception as e:
             print(f"❌ Error in face recognition: {e}")
         
         return recognized_faces
     
+    def recognize_session_frame(self, frame, session_id, camera_id=None, cohort=None):
+        """Recognize faces unless the frame barely changed since the last one
+        
+        Returns the recognized faces and whether they came from the cache.
+        """
+        key = (session_id, camera_id)
+        gate = self.frame_gates.get(key)
+        if gate is None:
+            self.evict_idle_frame_gates()
+            gate = FrameChangeDetector(self.frame_change_threshold, self.frame_max_skips)
+            self.frame_gates[key] = gate
+        
+        self.frames_received += 1
+        thumbnail = gate.thumbnail(frame)
+        if gate.unchanged(thumbnail):
+            gate.skips += 1
+            self.frames_skipped += 1
+            return gate.result, True
+        
+        tracker = self.face_trackers.get(key)
+        if tracker is None:
+            tracker = FaceTracker(self.track_resolve_confidence, recheck_frames=self.track_recheck_frames)
+            self.face_trackers[key] = tracker
+        
+        recognized_faces = self.recognize_face(frame, camera_id, tracker, cohort)
+        gate.reference = thumbnail
+        gate.result = recognized_faces
+        gate.skips = 0
+        return recognized_faces, False
+    
+    def evict_idle_frame_gates(self):
+        cutoff = time.monotonic() - self.frame_gate_idle_timeout
+        for key, gate in list(self.frame_gates.items()):
+            if gate.last_seen < cutoff:
+                self.frame_gates.pop(key, None)
+                self.face_trackers.pop(key, None)
+    
+    def end_session(self, session_id):
+        """Forget cached per-session recognition state"""
+        for key in list(self.frame_gates):
+            if key[0] == session_id:
+                self.frame_gates.pop(key, None)
+                self.face_trackers.pop(key, None)
+    
+    def frame_gate_stats(self):
+        """Report how many frames skipped recognition as unchanged"""
+        return {
+            'frames_received': self.frames_received,
+            'frames_skipped': self.frames_skipped,
+            'skip_rate': self.frames_skipped / self.frames_received if self.frames_received else 0,
+            'faces_predicted': self.faces_predicted
+        }
+    
     def get_student_by_face_id(self, face_id, app):
         """Get student details by face ID with app context"""
         with app.app_context():
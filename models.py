@@ -16,6 +16,9 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     is_active = db.Column(db.Boolean, default=True)
     
+    # Login looks users up by email and account type together
+    __table_args__ = (db.Index('ix_users_email_user_type', 'email', 'user_type'),)
+    
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     
@@ -40,6 +43,15 @@ class Student(db.Model):
     
     user = db.relationship('User', backref=db.backref('student', uselist=False))
     attendances = db.relationship('Attendance', backref='student', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_students_user_id', 'user_id'),
+        # Cohort lookups, and the admin directory's case-insensitive prefix
+        # search and keyset order, within a cohort or across all students
+        db.Index('ix_students_branch_year_lower_name_id', 'branch', 'year', db.func.lower(name), id),
+        db.Index('ix_students_lower_name_id', db.func.lower(name), id),
+        db.Index('ix_students_lower_roll_number_id', db.func.lower(roll_number), id),
+    )
 
 class Faculty(db.Model):
     __tablename__ = 'faculty'
@@ -53,6 +65,11 @@ class Faculty(db.Model):
     
     user = db.relationship('User', backref=db.backref('faculty', uselist=False))
     sessions = db.relationship('AttendanceSession', backref='faculty', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_faculty_user_id', 'user_id'),
+        db.Index('ix_faculty_lower_name_id', db.func.lower(name), id),
+    )
 
 class Admin(db.Model):
     __tablename__ = 'admins'
@@ -63,6 +80,8 @@ class Admin(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
     user = db.relationship('User', backref=db.backref('admin', uselist=False))
+    
+    __table_args__ = (db.Index('ix_admins_user_id', 'user_id'),)
 
 class AttendanceSession(db.Model):
     __tablename__ = 'attendance_sessions'
@@ -78,6 +97,11 @@ class AttendanceSession(db.Model):
     is_completed = db.Column(db.Boolean, default=False)
     
     attendances = db.relationship('Attendance', backref='session', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_attendance_sessions_branch_year', 'branch', 'year'),
+        db.Index('ix_attendance_sessions_faculty_id_start_time', 'faculty_id', 'start_time'),
+    )
 
 class Attendance(db.Model):
     __tablename__ = 'attendance'
@@ -88,4 +112,66 @@ class Attendance(db.Model):
     status = db.Column(db.String(10), nullable=False)
     marked_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
-    __table_args__ = (db.UniqueConstraint('student_id', 'session_id', name='unique_student_session'),)
\ No newline at end of file
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'session_id', name='unique_student_session'),
+        db.Index('ix_attendance_student_id_status', 'student_id', 'status'),
+        db.Index('ix_attendance_session_id_status', 'session_id', 'status'),
+    )
+
+class StudentAttendanceSummary(db.Model):
+    __tablename__ = 'student_attendance_summaries'
+    
+    # Kept up to date as sessions start and attendance is marked
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    total_sessions = db.Column(db.Integer, nullable=False, default=0)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    absent_count = db.Column(db.Integer, nullable=False, default=0)
+
+class SessionAttendanceSummary(db.Model):
+    __tablename__ = 'session_attendance_summaries'
+    
+    session_id = db.Column(db.Integer, db.ForeignKey('attendance_sessions.id'), primary_key=True)
+    cohort_size = db.Column(db.Integer, nullable=False, default=0)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+
+class AttendanceRollup(db.Model):
+    __tablename__ = 'attendance_rollups'
+    
+    # One row per day, cohort and faculty; updated_at lets pollers fetch deltas
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    branch = db.Column(db.String(50), nullable=False)
+    year = db.Column(db.String(10), nullable=False)
+    faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'), nullable=False)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    absent_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (db.UniqueConstraint('day', 'branch', 'year', 'faculty_id', name='unique_rollup_bucket'),)
+
+def existing_index_names(inspector, table_name):
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite reflection skips expression indexes, so read the catalog
+        with db.engine.connect() as connection:
+            return set(connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table_name,)
+            ).scalars())
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+def create_missing_indexes():
+    """Create the declared indexes that tables made by an older create_all lack
+    
+    create_all never alters existing tables, so this is the migration for
+    indexes added to the models later. Returns the names of created indexes.
+    """
+    inspector = db.inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = existing_index_names(inspector, table.name)
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
\ No newline at end of file
@@ -0,0 +1,462 @@
+"""Out-of-process face recognition shared by every web worker.
+
+Run it next to the web server, with the same RECOGNITION_SERVICE_KEY:
+
+    RECOGNITION_SERVICE_KEY=... python recognition_service.py [workers]
+
+It listens on a Unix socket only its user can open, recognition_service.sock
+unless RECOGNITION_SERVICE_ADDRESS names another; set that address for the
+web processes too. Requests are pickled, so only processes holding the key
+may connect.
+
+The service owns the face model: web processes only append registered
+faces to the sample store in FACE_DATA_FOLDER, and the service polls it,
+folds new samples into its model and flattens the result into one shared
+memory segment that all worker processes map read-only, so N workers cost
+one copy of the gallery instead of N. Web processes send face ROIs with
+RecognitionClient over multiprocessing.connection and never load the model
+themselves. Every task names the segment it was submitted against, so
+workers reattach when the gallery changes.
+"""
+import ctypes
+import itertools
+import multiprocessing
+import os
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from face_matcher import HistogramMatcher
+
+try:
+    malloc_trim = ctypes.CDLL('libc.so.6').malloc_trim
+except (OSError, AttributeError):  # not glibc: freed heap is left to the allocator
+    malloc_trim = None
+
+DEFAULT_ADDRESS = 'recognition_service.sock'
+
+
+def parse_address(address):
+    """'host:port' for TCP, anything else is a Unix socket path"""
+    if isinstance(address, tuple):
+        return address
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return (host or 'localhost', int(port))
+    return address
+
+
+class SharedGallery:
+    """A matcher's gallery arrays copied into one shared memory segment"""
+
+    def __init__(self, matcher, version):
+        rows, cols = matcher.sqrt_histograms.shape
+        size = rows * cols * 4 + rows * 8 + rows * 8
+        self.shm = SharedMemory(create=True, size=max(1, size))
+        self.descriptor = {
+            'name': self.shm.name,
+            'rows': rows,
+            'cols': cols,
+            'version': version,
+            'params': matcher.params()
+        }
+        sqrt_histograms, labels, row_sums = self.arrays(self.shm, self.descriptor)
+        sqrt_histograms[:] = matcher.sqrt_histograms
+        labels[:] = matcher.labels
+        row_sums[:] = matcher.row_sums
+
+    @staticmethod
+    def arrays(shm, descriptor):
+        """Views of the segment as (sqrt_histograms, labels, row_sums)"""
+        rows, cols = descriptor['rows'], descriptor['cols']
+        sqrt_histograms = np.ndarray((rows, cols), dtype=np.float32, buffer=shm.buf)
+        labels = np.ndarray((rows,), dtype=np.int64, buffer=shm.buf, offset=rows * cols * 4)
+        row_sums = np.ndarray((rows,), dtype=np.float64, buffer=shm.buf, offset=rows * cols * 4 + rows * 8)
+        return sqrt_histograms, labels, row_sums
+
+    @classmethod
+    def attach(cls, descriptor):
+        """Map a published gallery and wrap it in a read-only matcher"""
+        shm = SharedMemory(name=descriptor['name'])
+        arrays = cls.arrays(shm, descriptor)
+        for array in arrays:
+            array.flags.writeable = False
+        sqrt_histograms, labels, row_sums = arrays
+        matcher = HistogramMatcher(sqrt_histograms, labels, row_sums=row_sums, **descriptor['params'])
+        return shm, matcher
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def worker_loop(tasks, results):
+    """Match faces against whichever gallery each task was submitted for"""
+    shm, matcher = None, None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        request_id, descriptor, face_rois, allowed_labels = task
+        try:
+            if shm is None or shm.name != descriptor['name']:
+                if shm is not None:
+                    # The matcher's arrays export the buffer, drop them first
+                    matcher = None
+                    shm.close()
+                shm, matcher = SharedGallery.attach(descriptor)
+            results.put((request_id, matcher.predict_batch(face_rois, allowed_labels), None))
+        except Exception as e:
+            results.put((request_id, None, str(e)))
+
+    if shm is not None:
+        matcher = None
+        shm.close()
+
+
+class RecognitionService:
+    """Serve LBPH predictions from a pool of processes sharing one gallery"""
+
+    # Superseded galleries stay mapped this long for tasks already queued
+    RETIRE_AFTER = 60
+
+    def __init__(self, address, authkey, workers=None, model_dir='face_models', face_dir='face_data',
+                 poll_interval=5, rebuild_interval=50, timeout=10):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.workers = workers or os.cpu_count() or 1
+        self.model_dir = model_dir
+        self.face_dir = face_dir
+        self.poll_interval = poll_interval
+        self.rebuild_interval = rebuild_interval
+        # Seconds a frame waits for the workers, e.g. while a dead one is replaced
+        self.timeout = timeout
+        self.system = None
+        self.gallery = None
+        self.gallery_lock = threading.Lock()
+        self.retired = []
+        self.context = multiprocessing.get_context('spawn')
+        self.tasks = None
+        self.results = None
+        self.processes = []
+        self.listener = None
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.request_ids = itertools.count()
+        self.running = False
+        self.stopped = threading.Event()
+
+    def load_gallery(self):
+        """Fold samples new in the store into the model and publish it to shared memory
+
+        Returns whether a new gallery was published.
+        """
+        with self.gallery_lock:
+            return self.publish_gallery()
+
+    def publish_gallery(self):
+        if self.system is None:
+            from face_store import FaceSampleStore
+            from face_utils import FaceRecognitionSystem
+
+            self.system = FaceRecognitionSystem()
+            self.system.model_dir = self.model_dir
+            self.system.face_dir = self.face_dir
+            self.system.sample_store = FaceSampleStore(self.face_dir)
+            self.system.rebuild_interval = self.rebuild_interval
+            # Saved models are only a backup once the service trains from the store
+            self.system.save_pending = self.system.model_is_stale()
+
+        system = self.system
+        if len(system.sample_store) == 0:
+            # Nothing packed yet; serve a model saved before the sample store
+            model_path, version = system.latest_model_file()
+            if not model_path or self.gallery is not None:
+                return False
+            import cv2
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(model_path)
+        else:
+            if self.gallery is not None and len(system.sample_store) == system.serving_samples:
+                return False
+            with system.training_lock:
+                if not system.update_model():
+                    return False
+                if system.training_samples != system.serving_samples and not system.publish_model():
+                    return False
+            recognizer, version = system.recognizer, system.model_version
+        gallery = SharedGallery(HistogramMatcher.from_recognizer(recognizer), version)
+
+        if system.recognizer is not None:
+            # Frames are matched against the shared gallery, so the published
+            # recognizer is only needed as the next one to update
+            with system.recognizer_released:
+                system.training_recognizer, system.training_samples = system.recognizer, system.serving_samples
+                system.recognizer = None
+
+        if malloc_trim is not None:
+            # Building the gallery copies every histogram in blocks small enough
+            # that glibc keeps them after they are freed; hand them back
+            malloc_trim(0)
+
+        if self.gallery is not None:
+            self.retired.append((self.gallery, time.time()))
+        self.gallery = gallery
+        print(f"✅ Recognition service serving model v{version} ({gallery.descriptor['rows']} samples)")
+        return True
+
+    def start(self):
+        """Load the gallery, spawn the workers and start accepting clients"""
+        self.load_gallery()
+
+        self.start_workers()
+
+        self.listener = self.listen()
+        self.address = self.listener.address
+        self.running = True
+        for target in (self.dispatch_results, self.watch_samples, self.watch_workers, self.accept_clients):
+            threading.Thread(target=target, daemon=True).start()
+        print(f"✅ Recognition service listening on {self.address} with {self.workers} workers")
+
+    def listen(self):
+        """Listen on the service's address; a Unix socket is created readable by its user only"""
+        if isinstance(self.address, tuple):
+            return Listener(self.address, authkey=self.authkey)
+
+        if os.path.exists(self.address) and stat.S_ISSOCK(os.stat(self.address).st_mode):
+            # Left behind by a service that did not shut down cleanly
+            os.unlink(self.address)
+        umask = os.umask(0o177)
+        try:
+            return Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        finally:
+            os.umask(umask)
+
+    def start_workers(self):
+        """Create the task and result queues and a pool of workers reading them"""
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+        # Spawned workers start clean instead of inheriting the parent's model
+        self.processes = [self.context.Process(target=worker_loop, args=(self.tasks, self.results), daemon=True)
+                          for _ in range(self.workers)]
+        for process in self.processes:
+            process.start()
+
+    def stop(self):
+        self.running = False
+        self.stopped.set()
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+        self.processes = []
+        self.listener.close()
+        for gallery, _ in self.retired:
+            gallery.release()
+        self.retired = []
+        if self.gallery is not None:
+            self.gallery.release()
+            self.gallery = None
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def predict(self, face_rois, allowed_labels=None):
+        """Queue one frame of ROIs for the workers and wait for the result"""
+        if not face_rois:
+            return []
+        if self.gallery is None:
+            return [(-1, float('inf'))] * len(face_rois)
+
+        request_id = next(self.request_ids)
+        future = Future()
+        with self.pending_lock:
+            self.pending[request_id] = future
+        self.tasks.put((request_id, self.gallery.descriptor, face_rois, allowed_labels))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            raise TimeoutError(f"No recognition worker answered within {self.timeout}s")
+
+    def dispatch_results(self):
+        while self.running:
+            try:
+                request_id, predictions, error = self.results.get(timeout=1)
+            except Exception:
+                continue
+            with self.pending_lock:
+                future = self.pending.pop(request_id, None)
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(predictions)
+
+    def watch_samples(self):
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                self.load_gallery()
+            except Exception as e:
+                print(f"❌ Error updating model: {e}")
+
+            self.release_retired()
+
+    def release_retired(self, max_age=None):
+        """Unmap superseded galleries older than max_age seconds, RETIRE_AFTER by default"""
+        max_age = self.RETIRE_AFTER if max_age is None else max_age
+        now = time.time()
+        for gallery, retired_at in list(self.retired):
+            if now - retired_at >= max_age:
+                gallery.release()
+                self.retired.remove((gallery, retired_at))
+
+    def watch_workers(self):
+        """Restart the worker pool when a worker dies, e.g. killed for memory
+
+        A worker that dies while waiting for a task takes the task queue's
+        lock with it, so the whole pool is replaced along with its queues,
+        and the requests in flight fail at once.
+        """
+        while not self.stopped.wait(1):
+            dead = [process for process in self.processes if not process.is_alive()]
+            if not dead or not self.running:
+                continue
+
+            for process in dead:
+                print(f"⚠️ Recognition worker {process.pid} exited with code {process.exitcode}")
+            for process in self.processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join(timeout=5)
+            for old_queue in (self.tasks, self.results):
+                old_queue.cancel_join_thread()
+                old_queue.close()
+
+            with self.pending_lock:
+                lost, self.pending = self.pending, {}
+            self.start_workers()
+            for future in lost.values():
+                future.set_exception(RuntimeError("Recognition workers restarted"))
+            print(f"✅ Restarted {self.workers} recognition workers")
+
+    def accept_clients(self):
+        while self.running:
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                # Closed by stop(), or a client failed authentication
+                continue
+            threading.Thread(target=self.serve_client, args=(conn,), daemon=True).start()
+
+    def serve_client(self, conn):
+        """Answer one web process's requests in order until it disconnects"""
+        with conn:
+            while self.running:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+
+                try:
+                    if request[0] == 'predict':
+                        reply = ('ok', self.predict(request[1], request[2]))
+                    elif request[0] == 'status':
+                        reply = ('ok', self.status())
+                    else:
+                        reply = ('error', f"Unknown request {request[0]!r}")
+                except Exception as e:
+                    reply = ('error', str(e))
+
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    break
+
+    def status(self):
+        return {
+            'model_version': self.gallery.descriptor['version'] if self.gallery else 0,
+            'gallery_rows': self.gallery.descriptor['rows'] if self.gallery else 0,
+            # Samples in the store the served model covers
+            'trained_samples': self.system.serving_samples if self.system else None,
+            'workers': sum(process.is_alive() for process in self.processes),
+            'pending': len(self.pending)
+        }
+
+
+class RecognitionClient:
+    """Web-side handle on a RecognitionService, one connection per thread
+
+    timeout should exceed the service's own, so that a slow frame gets the
+    service's error rather than a dropped connection.
+    """
+
+    def __init__(self, address, authkey, timeout=15):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def request(self, *request):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self.local.conn = conn
+        try:
+            conn.send(request)
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"Recognition service did not answer within {self.timeout}s")
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            # Reconnect on the next call, e.g. after a service restart; a
+            # late answer must not be read as the reply to the next request
+            self.local.conn = None
+            conn.close()
+            raise
+        if status != 'ok':
+            raise RuntimeError(result)
+        return result
+
+    def predict(self, face_rois, allowed_labels=None):
+        """(label, distance) per ROI, only among allowed_labels if given"""
+        if not face_rois:
+            return []
+        return self.request('predict', list(face_rois), allowed_labels)
+
+    def status(self):
+        return self.request('status')
+
+
+if __name__ == '__main__':
+    from config import Config, DEFAULT_SECRET_KEY
+
+    if not Config.RECOGNITION_SERVICE_KEY or Config.RECOGNITION_SERVICE_KEY == DEFAULT_SECRET_KEY:
+        sys.exit("❌ Set RECOGNITION_SERVICE_KEY to a secret of its own before starting the service")
+
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else Config.RECOGNITION_SERVICE_WORKERS
+    service = RecognitionService(
+        Config.RECOGNITION_SERVICE_ADDRESS or DEFAULT_ADDRESS,
+        Config.RECOGNITION_SERVICE_KEY.encode(),
+        workers=workers,
+        model_dir=Config.FACE_MODEL_FOLDER,
+        face_dir=Config.FACE_DATA_FOLDER,
+        rebuild_interval=Config.FACE_MODEL_REBUILD_INTERVAL,
+        timeout=Config.RECOGNITION_SERVICE_TIMEOUT
+    )
+    service.serve_forever()
@@ -0,0 +1,275 @@
+import calendar
+import csv
+import io
+import threading
+from collections import OrderedDict
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, extract, func, select
+
+from attendance_utils import build_session_summaries
+from models import db, Faculty, AttendanceSession, Attendance, AttendanceRollup, SessionAttendanceSummary
+
+
+# Rows fetched per round trip when streaming reports
+STREAM_BATCH_SIZE = 1000
+
+
+def day_of_week(column):
+    """Day of the week of a date column, 0 for Sunday as in strftime('%w')"""
+    if db.engine.dialect.name in ('mysql', 'mariadb'):
+        # MySQL has no dow field; DAYOFWEEK() counts from 1 for Sunday
+        return func.dayofweek(column) - 1
+    return extract('dow', column)
+
+
+def stream_csv(rows, batch_size=STREAM_BATCH_SIZE):
+    """Render rows to CSV text in chunks of batch_size rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def student_attendance_rows(student_id):
+    """Stream a student's (date, class, status, start time) rows, newest first"""
+    query = select(
+        AttendanceSession.session_date,
+        AttendanceSession.class_name,
+        Attendance.status,
+        AttendanceSession.start_time
+    ).join(AttendanceSession, Attendance.session_id == AttendanceSession.id).where(
+        Attendance.student_id == student_id
+    ).order_by(AttendanceSession.session_date.desc()).execution_options(
+        yield_per=STREAM_BATCH_SIZE
+    )
+    return db.session.execute(query)
+
+
+def iter_faculty_session_stats(faculty_id):
+    """Per-session cohort size and present count for a faculty, from the session summaries
+
+    Yields dicts ordered newest session first, shaped for both the CSV and
+    the PDF report, fetching STREAM_BATCH_SIZE rows at a time.
+    """
+    build_session_summaries(faculty_id)
+    query = select(
+        AttendanceSession.session_date,
+        AttendanceSession.class_name,
+        AttendanceSession.branch,
+        AttendanceSession.year,
+        AttendanceSession.is_completed,
+        SessionAttendanceSummary.cohort_size.label('total_students'),
+        SessionAttendanceSummary.present_count
+    ).join(
+        SessionAttendanceSummary, SessionAttendanceSummary.session_id == AttendanceSession.id
+    ).where(
+        AttendanceSession.faculty_id == faculty_id
+    ).order_by(AttendanceSession.session_date.desc()).execution_options(
+        yield_per=STREAM_BATCH_SIZE
+    )
+
+    for row in db.session.execute(query):
+        total_students, present_count = row.total_students, row.present_count
+        yield {
+            'date': row.session_date,
+            'class_name': row.class_name,
+            'branch': row.branch,
+            'year': row.year,
+            'is_completed': row.is_completed,
+            'total_students': total_students,
+            'present_count': present_count,
+            'absent_count': total_students - present_count,
+            'attendance_percentage': (present_count / total_students * 100) if total_students > 0 else 0
+        }
+
+
+def faculty_session_stats(faculty_id):
+    """iter_faculty_session_stats as a list, for the PDF report"""
+    return list(iter_faculty_session_stats(faculty_id))
+
+
+class FacultyReportTotals:
+    """Running totals over faculty_session_stats rows, filled while streaming"""
+
+    def __init__(self):
+        self.total_sessions = 0
+        self.completed_sessions = 0
+        self.total_present = 0
+        self.total_students_all = 0
+
+    def add(self, session):
+        self.total_sessions += 1
+        self.completed_sessions += bool(session['is_completed'])
+        self.total_present += session['present_count']
+        self.total_students_all += session['total_students']
+        return session
+
+    def summary(self):
+        return {
+            'total_sessions': self.total_sessions,
+            'completed_sessions': self.completed_sessions,
+            'active_sessions': self.total_sessions - self.completed_sessions,
+            'total_present': self.total_present,
+            'overall_percentage': (self.total_present / self.total_students_all * 100) if self.total_students_all > 0 else 0
+        }
+
+
+def faculty_report_summary(sessions):
+    """Totals over the rows of faculty_session_stats"""
+    totals = FacultyReportTotals()
+    for session in sessions:
+        totals.add(session)
+    return totals.summary()
+
+
+def faculty_analytics_summary(faculty_id, recent=10):
+    """Session counts, overall attendance and the recent sessions of a faculty
+
+    Reads the session summaries; recent is a list of (session, present
+    count, cohort size), newest first.
+    """
+    build_session_summaries(faculty_id)
+    totals = db.session.execute(
+        select(
+            func.count(AttendanceSession.id),
+            func.coalesce(func.sum(case((AttendanceSession.is_completed, 1), else_=0)), 0),
+            func.coalesce(func.sum(SessionAttendanceSummary.present_count), 0),
+            func.coalesce(func.sum(SessionAttendanceSummary.cohort_size), 0)
+        ).join(
+            SessionAttendanceSummary, SessionAttendanceSummary.session_id == AttendanceSession.id
+        ).where(AttendanceSession.faculty_id == faculty_id)
+    ).one()
+    total_sessions, completed_sessions, present_count, cohort_size = (int(value) for value in totals)
+    recent_sessions = db.session.execute(
+        select(AttendanceSession, SessionAttendanceSummary.present_count, SessionAttendanceSummary.cohort_size).join(
+            SessionAttendanceSummary, SessionAttendanceSummary.session_id == AttendanceSession.id
+        ).where(AttendanceSession.faculty_id == faculty_id).order_by(
+            AttendanceSession.start_time.desc()
+        ).limit(recent)
+    ).all()
+    return {
+        'total_sessions': total_sessions,
+        'completed_sessions': completed_sessions,
+        'active_sessions': total_sessions - completed_sessions,
+        'overall_percentage': (present_count / cohort_size * 100) if cohort_size > 0 else 0,
+        'recent_sessions': recent_sessions
+    }
+
+
+# Months shown on the student analytics page
+ANALYTICS_MONTHS = 6
+ANALYTICS_CACHE_SIZE = 1000
+
+analytics_cache = OrderedDict()
+analytics_cache_lock = threading.Lock()
+
+
+def percentage(present, total):
+    return round(present / total * 100) if total > 0 else 0
+
+
+def compute_student_breakdown(student_id):
+    """Monthly and weekday attendance of a student, with two grouped queries"""
+    present = func.sum(case((Attendance.status == 'Present', 1), else_=0))
+    year = extract('year', AttendanceSession.session_date)
+    month = extract('month', AttendanceSession.session_date)
+    months = db.session.execute(
+        select(year, month, present, func.count(Attendance.id)).join(
+            AttendanceSession, Attendance.session_id == AttendanceSession.id
+        ).where(Attendance.student_id == student_id).group_by(year, month).order_by(
+            year.desc(), month.desc()
+        ).limit(ANALYTICS_MONTHS)
+    ).all()
+    months_data = [{
+        'month': f"{calendar.month_abbr[int(month_number)]} {int(year_number)}",
+        'present': int(present_count),
+        'total': total,
+        'percentage': percentage(present_count, total)
+    } for year_number, month_number, present_count, total in reversed(months)]
+
+    weekday = day_of_week(AttendanceSession.session_date)
+    weekdays = {int(day): (int(present_count), total) for day, present_count, total in db.session.execute(
+        select(weekday, present, func.count(Attendance.id)).join(
+            AttendanceSession, Attendance.session_id == AttendanceSession.id
+        ).where(Attendance.student_id == student_id).group_by(weekday)
+    )}
+    day_stats = []
+    for day in range(7):
+        present_count, total = weekdays.get((day + 1) % 7, (0, 0))
+        day_stats.append({
+            'day': calendar.day_name[day],
+            'present': present_count,
+            'total': total,
+            'percentage': percentage(present_count, total)
+        })
+    return months_data, day_stats
+
+
+def student_breakdown(student_id, version):
+    """compute_student_breakdown, cached until the student's counters change
+
+    version is anything that changes whenever the student's attendance
+    does, such as their summary counters.
+    """
+    with analytics_cache_lock:
+        cached = analytics_cache.get(student_id)
+        if cached and cached[0] == version:
+            analytics_cache.move_to_end(student_id)
+            return cached[1]
+
+    breakdown = compute_student_breakdown(student_id)
+    with analytics_cache_lock:
+        analytics_cache[student_id] = (version, breakdown)
+        analytics_cache.move_to_end(student_id)
+        while len(analytics_cache) > ANALYTICS_CACHE_SIZE:
+            analytics_cache.popitem(last=False)
+    return breakdown
+
+
+# Delta polls re-send buckets touched this long before `since`, so rows
+# committed by transactions that were still open at the last poll are not lost
+ROLLUP_SINCE_OVERLAP = timedelta(seconds=60)
+
+
+def rollup_changes(since=None):
+    """Rollup buckets changed after since, or all of them when since is None
+
+    Buckets carry absolute counts, so clients replace rather than add them
+    and overlapping polls are harmless; clients compute the rates.
+    """
+    generated_at = datetime.now(timezone.utc)
+    query = select(AttendanceRollup)
+    if since is not None:
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        query = query.where(AttendanceRollup.updated_at > since - ROLLUP_SINCE_OVERLAP)
+
+    buckets = [{
+        'day': rollup.day.isoformat(),
+        'branch': rollup.branch,
+        'year': rollup.year,
+        'faculty_id': rollup.faculty_id,
+        'present': rollup.present_count,
+        'absent': rollup.absent_count
+    } for rollup in db.session.scalars(query)]
+
+    faculty_ids = {bucket['faculty_id'] for bucket in buckets}
+    faculty_names = dict(db.session.execute(
+        select(Faculty.id, Faculty.name).where(Faculty.id.in_(faculty_ids))
+    ).all()) if faculty_ids else {}
+
+    changes = {
+        'generated_at': generated_at.isoformat(),
+        'full': since is None,
+        'buckets': buckets,
+        'faculty': {str(faculty_id): name for faculty_id, name in faculty_names.items()}
+    }
+    return changes
@@ -4,6 +4,8 @@ let videoStream = null;
 let isCameraActive = false;
 let recognitionInterval = null;
 let currentSessionId = null;
+let maxFrameWidth = 960;
+let recognitionSocket = null;
 
 // Initialize face registration
 function initializeFaceRegistration() {
@@ -40,7 +42,7 @@ function initializeFaceRegistration() {
 }
 
 // Initialize attendance session with real-time recognition
-function initializeAttendanceSession(sessionId) {
+function initializeAttendanceSession(sessionId, frameWidth) {
     const video = document.getElementById('video');
     const canvas = document.getElementById('canvas');
     const faceIndicator = document.getElementById('face-indicator');
@@ -49,11 +51,17 @@ function initializeAttendanceSession(sessionId) {
     const stopBtn = document.getElementById('stop-camera');
 
     currentSessionId = sessionId;
+    if (frameWidth) {
+        maxFrameWidth = frameWidth;
+    }
     let recognizedStudents = new Set();
 
     // Start camera
     startCamera(video);
 
+    // Prefer one long-lived channel over a request per frame
+    openRecognitionStream(sessionId, faceIndicator, studentsList, recognizedStudents);
+
     // Start real-time face recognition
     recognitionInterval = setInterval(() => {
         if (isCameraActive && video.readyState === video.HAVE_ENOUGH_DATA) {
@@ -73,60 +81,99 @@ function initializeAttendanceSession(sessionId) {
 // Process video frame for face recognition
 function processVideoFrame(video, canvas, sessionId, faceIndicator, studentsList, recognizedStudents) {
     const context = canvas.getContext('2d');
-    canvas.width = video.videoWidth;
-    canvas.height = video.videoHeight;
+    // The server gains nothing from frames wider than it detects on
+    const scale = Math.min(1, maxFrameWidth / video.videoWidth);
+    canvas.width = Math.round(video.videoWidth * scale);
+    canvas.height = Math.round(video.videoHeight * scale);
     context.drawImage(video, 0, 0, canvas.width, canvas.height);
     
-    // Convert canvas to base64
-    const imageData = canvas.toDataURL('image/jpeg', 0.8);
-    
-    // Send to server for face recognition
-    fetch('/faculty/take-attendance', {
+    // Send the raw JPEG bytes for face recognition
+    canvas.toBlob(blob => {
+        if (!blob) {
+            return;
+        }
+        if (recognitionSocket && recognitionSocket.readyState === WebSocket.OPEN) {
+            recognitionSocket.send(blob);
+        } else {
+            sendVideoFrame(blob, sessionId, faceIndicator, studentsList, recognizedStudents);
+        }
+    }, 'image/jpeg', 0.8);
+}
+
+// Open the streaming recognition channel, falling back to HTTP uploads if it fails
+function openRecognitionStream(sessionId, faceIndicator, studentsList, recognizedStudents) {
+    if (!('WebSocket' in window)) {
+        return;
+    }
+
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/faculty/attendance-stream/${sessionId}`);
+
+    socket.addEventListener('message', event => {
+        handleRecognitionResults(JSON.parse(event.data), faceIndicator, studentsList, recognizedStudents);
+    });
+
+    socket.addEventListener('close', () => {
+        if (recognitionSocket === socket) {
+            recognitionSocket = null;
+        }
+    });
+
+    recognitionSocket = socket;
+}
+
+// Upload a captured frame and show newly recognized students
+function sendVideoFrame(blob, sessionId, faceIndicator, studentsList, recognizedStudents) {
+    fetch(`/faculty/take-attendance/frame?session_id=${sessionId}`, {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/json',
+            'Content-Type': 'image/jpeg',
         },
-        body: JSON.stringify({
-            action: 'process_frame',
-            image: imageData,
-            session_id: sessionId
-        })
+        body: blob
     })
     .then(response => response.json())
     .then(data => {
-        if (data.faces && data.faces.length > 0) {
-            data.faces.forEach(faceData => {
-                if (faceData.success && !recognizedStudents.has(faceData.student.id)) {
-                    recognizedStudents.add(faceData.student.id);
-                    
-                    // Update UI
-                    faceIndicator.innerHTML = `
-                        <i class="fas fa-check-circle success"></i>
-                        <span>Recognized: ${faceData.student.name}</span>
-                        <small>Confidence: ${faceData.student.confidence.toFixed(1)}%</small>
-                    `;
-                    faceIndicator.className = 'face-indicator success';
-                    
-                    // Add to students list
-                    addStudentToList(faceData.student, studentsList);
-                    
-                    // Reset indicator after 3 seconds
-                    setTimeout(() => {
-                        faceIndicator.innerHTML = `
-                            <i class="fas fa-user"></i>
-                            <span>Ready for face detection...</span>
-                        `;
-                        faceIndicator.className = 'face-indicator';
-                    }, 3000);
-                }
-            });
-        }
+        handleRecognitionResults(data, faceIndicator, studentsList, recognizedStudents);
     })
     .catch(error => {
         console.error('Error processing frame:', error);
     });
 }
 
+// Show newly recognized students from a recognition response or event
+function handleRecognitionResults(data, faceIndicator, studentsList, recognizedStudents) {
+    if (data.max_frame_width) {
+        maxFrameWidth = data.max_frame_width;
+    }
+    if (data.faces && data.faces.length > 0) {
+        data.faces.forEach(faceData => {
+            if (faceData.success && !recognizedStudents.has(faceData.student.id)) {
+                recognizedStudents.add(faceData.student.id);
+                
+                // Update UI
+                faceIndicator.innerHTML = `
+                    <i class="fas fa-check-circle success"></i>
+                    <span>Recognized: ${faceData.student.name}</span>
+                    <small>Confidence: ${faceData.student.confidence.toFixed(1)}%</small>
+                `;
+                faceIndicator.className = 'face-indicator success';
+                
+                // Add to students list
+                addStudentToList(faceData.student, studentsList);
+                
+                // Reset indicator after 3 seconds
+                setTimeout(() => {
+                    faceIndicator.innerHTML = `
+                        <i class="fas fa-user"></i>
+                        <span>Ready for face detection...</span>
+                    `;
+                    faceIndicator.className = 'face-indicator';
+                }, 3000);
+            }
+        });
+    }
+}
+
 // Start camera
 async function startCamera(videoElement) {
     try {
@@ -163,6 +210,11 @@ function stopCamera() {
         clearInterval(recognitionInterval);
         recognitionInterval = null;
     }
+
+    if (recognitionSocket) {
+        recognitionSocket.close();
+        recognitionSocket = null;
+    }
 }
 
 // Capture image
@@ -6,6 +6,9 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function initializeCharts() {
+    // Chart.js is optional; pages without it only get the stats lists
+    if (typeof Chart === 'undefined') return;
+
     // Attendance Distribution Chart
     initializeAttendanceChart();
     
@@ -157,13 +160,86 @@ function exportData(format) {
     }, 2000);
 }
 
+// Rollup buckets by day/branch/year/faculty, kept current from API deltas
+const analyticsState = {
+    since: null,
+    buckets: {},
+    faculty: {}
+};
+
 // Real-time data updates
 function updateRealTimeData() {
-    // This would typically connect to WebSocket or make periodic API calls
-    console.log('Updating real-time data...');
+    // After the first load only buckets changed since the last poll are sent
+    let url = '/admin/analytics/data';
+    if (analyticsState.since) {
+        url += `?since=${encodeURIComponent(analyticsState.since)}`;
+    }
+
+    fetch(url)
+    .then(response => response.json())
+    .then(data => {
+        if (!data.buckets) {
+            return;
+        }
+        if (data.full) {
+            analyticsState.buckets = {};
+        }
+        data.buckets.forEach(bucket => {
+            analyticsState.buckets[`${bucket.day}|${bucket.branch}|${bucket.year}|${bucket.faculty_id}`] = bucket;
+        });
+        Object.assign(analyticsState.faculty, data.faculty);
+        analyticsState.since = data.generated_at;
+        renderAnalyticsRates();
+    })
+    .catch(error => {
+        console.error('Error updating analytics:', error);
+    });
+}
+
+// Attendance rates of the known buckets grouped by one dimension
+function summarizeBuckets(keyOf) {
+    const totals = {};
+    Object.values(analyticsState.buckets).forEach(bucket => {
+        const key = keyOf(bucket);
+        totals[key] = totals[key] || { present: 0, total: 0 };
+        totals[key].present += bucket.present;
+        totals[key].total += bucket.present + bucket.absent;
+    });
+    return Object.keys(totals).sort().map(label => ({
+        label: label,
+        present: totals[label].present,
+        total: totals[label].total,
+        percentage: totals[label].total ? Math.round(totals[label].present / totals[label].total * 100) : 0
+    }));
+}
+
+function renderAnalyticsRates() {
+    const dimensions = {
+        'branch-stats': bucket => bucket.branch,
+        'year-stats': bucket => bucket.year,
+        'faculty-stats': bucket => analyticsState.faculty[bucket.faculty_id] || `Faculty ${bucket.faculty_id}`,
+        'day-stats': bucket => bucket.day
+    };
+
+    Object.entries(dimensions).forEach(([elementId, keyOf]) => {
+        const element = document.getElementById(elementId);
+        if (!element) return;
+
+        let rates = summarizeBuckets(keyOf);
+        if (elementId === 'day-stats') {
+            rates = rates.slice(-7).reverse(); // latest week first
+        }
+        element.innerHTML = rates.length ? rates.map(rate => `
+            <div class="stat-item">
+                <span class="stat-label">${escapeHtml(rate.label)}</span>
+                <span class="stat-value">${rate.percentage}% attendance (${rate.present}/${rate.total})</span>
+            </div>
+        `).join('') : '<p>No attendance recorded yet</p>';
+    });
 }
 
 // Initialize real-time updates if on analytics page
 if (window.location.pathname.includes('analytics')) {
+    updateRealTimeData();
     setInterval(updateRealTimeData, 30000); // Update every 30 seconds
 }
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Drive the attendance streaming channel without a browser.
+
+Logs in as a faculty member, opens /faculty/attendance-stream/<session_id>
+and sends JPEG frames from files or a webcam, printing every event the
+server pushes back.
+
+    python tools/stream_client.py --email f@college.edu --password secret \\
+        --session 12 frame1.jpg frame2.jpg
+    python tools/stream_client.py --email f@college.edu --password secret \\
+        --session 12 --webcam 0 --frames 60
+"""
+import argparse
+import http.cookiejar
+import json
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import cv2
+import simple_websocket
+
+
+def login(base_url, email, password):
+    """Log in through the normal form and return the session cookie header"""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    form = urllib.parse.urlencode({'email': email, 'password': password, 'user_type': 'faculty'})
+    opener.open(base_url + '/login', form.encode())
+    if not any(cookie.name == 'session' for cookie in jar):
+        sys.exit('Login failed')
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+
+def file_frames(paths):
+    for path in paths:
+        with open(path, 'rb') as f:
+            yield f.read()
+
+
+def webcam_frames(device, count):
+    capture = cv2.VideoCapture(device)
+    try:
+        for _ in range(count):
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+    finally:
+        capture.release()
+
+
+def print_events(ws):
+    try:
+        while True:
+            event = json.loads(ws.receive())
+            print(json.dumps(event))
+    except simple_websocket.ConnectionClosed:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*', help='JPEG files to send as frames')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--session', type=int, required=True, help='attendance session id')
+    parser.add_argument('--camera-id')
+    parser.add_argument('--webcam', type=int, help='capture frames from this camera device')
+    parser.add_argument('--frames', type=int, default=30, help='webcam frames to send')
+    parser.add_argument('--fps', type=float, default=1.0)
+    args = parser.parse_args()
+
+    cookie = login(args.url, args.email, args.password)
+    ws_url = args.url.replace('http', 'ws', 1) + f'/faculty/attendance-stream/{args.session}'
+    ws = simple_websocket.Client.connect(ws_url, headers={'Cookie': cookie})
+
+    listener = threading.Thread(target=print_events, args=(ws,), daemon=True)
+    listener.start()
+
+    frames = webcam_frames(args.webcam, args.frames) if args.webcam is not None else file_frames(args.images)
+    try:
+        if args.camera_id:
+            ws.send(json.dumps({'camera_id': args.camera_id}))
+
+        for frame in frames:
+            ws.send(frame)
+            time.sleep(1 / args.fps)
+
+        # Give the server a moment to answer the last frame
+        time.sleep(1)
+        ws.close()
+    except simple_websocket.ConnectionClosed as e:
+        sys.exit(f'Connection closed by server: {e.reason} {e.message}')
+    listener.join(timeout=1)
+
+
+if __name__ == '__main__':
+    main()